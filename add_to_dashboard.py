@@ -4,6 +4,8 @@ import json
 import os
 from datetime import datetime
 import argparse
+from comparison_format import FILE_FORMATS, comparison_suffix, missing_dependency, write_comparison
+from index_log import INDEX_LOG_FILE, append_index_entry
 
 def main():
     # Set up argument parser
@@ -14,9 +16,17 @@ def main():
                         help='Directory where dashboard files are stored')
     parser.add_argument('--metadata', type=str, default="{}",
                         help='JSON string of metadata to include')
+    parser.add_argument('--output_format', type=str, default="json", choices=list(FILE_FORMATS),
+                        help='Write the dashboard file as JSON, MessagePack or CBOR')
+    parser.add_argument('--compression', type=str, default="none", choices=["none", "zstd"],
+                        help='Compress the dashboard file with zstd')
     
     # Parse arguments
     args = parser.parse_args()
+    compression = None if args.compression == "none" else args.compression
+    missing = missing_dependency(args.output_format, compression)
+    if missing:
+        parser.error(f"--output_format {args.output_format} --compression {args.compression} needs {missing} (pip install {missing})")
     
     # Parse metadata if provided
     try:
@@ -129,43 +139,25 @@ def main():
     # Create a unique filename based on timestamp and file labels
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     labels_part = "-".join(file_labels)
-    output_file = os.path.join(args.output_dir, f"dashboard_{labels_part}_{timestamp}.json")
+    output_file = os.path.join(args.output_dir,
+                               f"dashboard_{labels_part}_{timestamp}{comparison_suffix(args.output_format, compression)}")
     
     # Save the dashboard-ready data
-    with open(output_file, 'w') as f:
-        json.dump(dashboard_data, f, indent=2)
-    
-    # Update the index file
-    index_file = os.path.join(args.output_dir, "index.json")
-    if os.path.exists(index_file):
-        with open(index_file, 'r') as f:
-            try:
-                index_data = json.load(f)
-            except json.JSONDecodeError:
-                index_data = {"comparisons": []}
-    else:
-        index_data = {"comparisons": []}
+    write_comparison(output_file, dashboard_data, args.output_format, compression)
     
     # Add the new comparison to the index
-    new_entry = {
+    append_index_entry(args.output_dir, {
         "file": os.path.basename(output_file),
         "timestamp": datetime.now().isoformat(),
         "file_labels": file_labels,
         "metadata": metadata
-    }
-    
-    index_data["comparisons"].append(new_entry)
-    index_data["comparisons"].sort(key=lambda x: x["timestamp"], reverse=True)
-    
-    # Write the updated index
-    with open(index_file, 'w') as f:
-        json.dump(index_data, f, indent=2)
+    })
     
     print(json.dumps({
         "status": "success",
         "message": f"Successfully added comparison to dashboard",
         "dashboard_file": output_file,
-        "index_file": index_file
+        "index_file": os.path.join(args.output_dir, INDEX_LOG_FILE)
     }, indent=2))
 
 if __name__ == "__main__":
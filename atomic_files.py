@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+import os
+import threading
+from contextlib import contextmanager
+
+
+@contextmanager
+def atomic_path(path):
+    """Yield a temporary path next to path and move it into place when the block completes
+
+    Readers see either the previous file or the complete new one, never
+    a partial file. The temporary name is unique per process and thread,
+    so concurrent writers do not clobber each other's files; if the block
+    raises, the temporary file is removed.
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+@contextmanager
+def atomic_open(path, mode='wb'):
+    """Open a file for writing through atomic_path"""
+    with atomic_path(path) as tmp_path:
+        with open(tmp_path, mode) as f:
+            yield f
+
+
+def private_dir(path):
+    """Create a directory if needed; True if it belongs to the current user and only they can write to it
+
+    For directories whose contents are loaded as code (pickles, template
+    bytecode). Raises OSError when the directory cannot be created.
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    stat = os.stat(path)
+    return not hasattr(os, "getuid") or (stat.st_uid == os.getuid() and not stat.st_mode & 0o022)
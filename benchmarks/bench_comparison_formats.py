@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""Size, write time and load time of each comparison file format.
+
+Builds a synthetic dashboard comparison and writes it in every format
+whose package is installed (JSON, MessagePack, CBOR, each with and
+without zstd), then times reading it back in full and reading only
+its metadata, the way the dashboard does for the index page.
+
+    python benchmarks/bench_comparison_formats.py --endpoints 20000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from comparison_format import (FILE_FORMATS, comparison_suffix, missing_dependency, read_comparison,  # noqa: E402
+                               read_comparison_metadata, write_comparison)
+
+
+def build_comparison(endpoint_count):
+    """Return dashboard data with nested differences on every other endpoint"""
+    rng = random.Random(0)
+    endpoints = {}
+    for i in range(endpoint_count):
+        changed = i % 2 == 0
+        differences = {}
+        if changed:
+            differences = {
+                "response": {
+                    "items": {
+                        str(j): {
+                            "price": {"type": "value_mismatch", "before.json": round(rng.uniform(1, 500), 2),
+                                      "after.json": round(rng.uniform(1, 500), 2)},
+                            "sku": {"type": "value_mismatch", "before.json": f"sku-{rng.getrandbits(48):012x}",
+                                    "after.json": f"sku-{rng.getrandbits(48):012x}"}
+                        } for j in range(8)
+                    }
+                },
+                "headers": {"etag": {"type": "value_mismatch", "before.json": f'"{rng.getrandbits(64):016x}"',
+                                  "after.json": f'"{rng.getrandbits(64):016x}"'}}
+            }
+        endpoints[f"GET:api.example.com/v1/items/{i}"] = {
+            "method": "GET",
+            "host": "api.example.com",
+            "path": f"/v1/items/{i}",
+            "status": "changed" if changed else "unchanged",
+            "present_in": ["before.json", "after.json"],
+            "missing_in": [],
+            "differences": differences
+        }
+    return {
+        "metadata": {
+            "comparison_time": "2024-01-01T00:00:00",
+            "file_labels": ["before", "after"],
+            "custom_metadata": {},
+            "total_endpoints": endpoint_count,
+            "endpoints_with_changes": (endpoint_count + 1) // 2
+        },
+        "endpoints": endpoints,
+        "summary": {"by_host": {}, "by_change_type": {"added": [], "removed": [], "modified": []}}
+    }
+
+
+def best_of(repeat, func):
+    """Return the fastest of several timed calls, in seconds"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--endpoints', type=int, default=20000,
+                        help='Endpoints in the synthetic comparison')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Timed runs per measurement (the fastest is reported)')
+    args = parser.parse_args()
+
+    data = build_comparison(args.endpoints)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for file_format in FILE_FORMATS:
+            for compression in (None, "zstd"):
+                name = file_format + ("+zstd" if compression else "")
+                missing = missing_dependency(file_format, compression)
+                if missing:
+                    print(f"{name:>13}  skipped ({missing} is not installed)", file=sys.stderr)
+                    continue
+                path = os.path.join(tmp_dir, "comparison" + comparison_suffix(file_format, compression))
+                write_s = best_of(args.repeat, lambda: write_comparison(path, data, file_format, compression))
+                load_s = best_of(args.repeat, lambda: read_comparison(path))
+                metadata_s = best_of(args.repeat, lambda: read_comparison_metadata(path))
+                assert read_comparison(path) == data
+                row = {
+                    "format": name,
+                    "size_bytes": os.path.getsize(path),
+                    "write_ms": round(write_s * 1000, 1),
+                    "load_ms": round(load_s * 1000, 1),
+                    "metadata_ms": round(metadata_s * 1000, 1)
+                }
+                results.append(row)
+                print(f"{name:>13}  {row['size_bytes'] / 1e6:8.2f} MB  write {row['write_ms']:>8} ms  "
+                      f"load {row['load_ms']:>8} ms  metadata {row['metadata_ms']:>8} ms", file=sys.stderr)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""Cold start and latency of simple_dashboard under concurrent clients.
+
+Writes a synthetic comparison, then for the debug server and for
+--production starts simple_dashboard.py in a subprocess, measures the
+time until the first page is served, and has several client threads
+request a mix of pages and API routes. Reports latency percentiles and
+throughput per mode.
+
+    python benchmarks/bench_dashboard_concurrency.py --clients 16 --requests 50
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = {
+    "debug": [],
+    "production": ["--production"]
+}
+
+
+def write_comparison(path, endpoint_count):
+    """Write a dashboard comparison file with endpoint_count changed endpoints"""
+    endpoints = {}
+    for i in range(endpoint_count):
+        endpoints[f"GET:/v1/items/{i}"] = {
+            "method": "GET",
+            "host": f"api{i % 5}.example.com",
+            "path": f"/v1/items/{i}",
+            "status": "changed",
+            "present_in": ["before.json", "after.json"],
+            "missing_in": [],
+            "differences": {
+                "response": {
+                    str(j): {"price": {"type": "value_mismatch", "before.json": j, "after.json": j + 1}}
+                    for j in range(10)
+                }
+            }
+        }
+    data = {
+        "metadata": {
+            "comparison_time": "2024-01-01T00:00:00",
+            "file_labels": ["before", "after"],
+            "custom_metadata": {},
+            "total_endpoints": endpoint_count,
+            "endpoints_with_changes": endpoint_count
+        },
+        "endpoints": endpoints,
+        "summary": {"by_host": {}, "by_change_type": {"added": [], "removed": [], "modified": list(endpoints)}}
+    }
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
+    return list(endpoints)
+
+
+def fetch(url):
+    """GET a URL and return its status code"""
+    try:
+        with urllib.request.urlopen(url, timeout=60) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def wait_until_up(base_url, timeout=60):
+    """Return seconds until the index page answers 200"""
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        try:
+            if fetch(base_url + "/") == 200:
+                return time.perf_counter() - start
+        except (urllib.error.URLError, ConnectionError):
+            pass
+        time.sleep(0.02)
+    raise RuntimeError("dashboard did not start")
+
+
+def run_clients(urls, clients, requests_per_client):
+    """Request urls round-robin from several threads; return (latencies, seconds, errors)"""
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def client(offset):
+        own = []
+        for i in range(requests_per_client):
+            url = urls[(offset + i) % len(urls)]
+            start = time.perf_counter()
+            try:
+                status = fetch(url)
+            except (urllib.error.URLError, ConnectionError) as e:
+                status = str(e)
+            own.append(time.perf_counter() - start)
+            if status != 200:
+                with lock:
+                    errors.append(status)
+        with lock:
+            latencies.extend(own)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, time.perf_counter() - start, errors
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=16,
+                        help='Concurrent client threads')
+    parser.add_argument('--requests', type=int, default=50,
+                        help='Requests per client')
+    parser.add_argument('--endpoints', type=int, default=5000,
+                        help='Endpoints in the synthetic comparison')
+    parser.add_argument('--port', type=int, default=5077,
+                        help='Port to run the dashboard on')
+    parser.add_argument('--modes', nargs='+', default=list(MODES), choices=list(MODES),
+                        help='Server modes to benchmark')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as data_dir:
+        filename = "api_comparison_bench.json"
+        keys = write_comparison(os.path.join(data_dir, filename), args.endpoints)
+        base_url = f"http://127.0.0.1:{args.port}"
+        urls = [
+            f"{base_url}/",
+            f"{base_url}/comparison/{filename}",
+            f"{base_url}/api/endpoints?file={filename}&fields=method,host,path,status&limit=200",
+        ] + [
+            f"{base_url}/api/endpoint?" + urllib.parse.urlencode({"file": filename, "key": key})
+            for key in keys[:: max(1, len(keys) // 20)]
+        ]
+
+        for mode in args.modes:
+            command = [sys.executable, os.path.join(REPO_DIR, "simple_dashboard.py"),
+                       "--data-dir", data_dir, "--port", str(args.port)] + MODES[mode]
+            # A new session so the debug server's reloader child is stopped too
+            server = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                      start_new_session=True)
+            try:
+                cold_start = wait_until_up(base_url)
+                latencies, elapsed, errors = run_clients(urls, args.clients, args.requests)
+            finally:
+                os.killpg(server.pid, signal.SIGTERM)
+                server.wait()
+
+            row = {
+                "mode": mode,
+                "cold_start_ms": round(cold_start * 1000, 1),
+                "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+                "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+                "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+                "requests_per_s": round(len(latencies) / elapsed, 1),
+                "errors": len(errors)
+            }
+            results.append(row)
+            print(f"{mode:>10}  cold start {row['cold_start_ms']:>7} ms  p50 {row['p50_ms']:>6} ms  "
+                  f"p99 {row['p99_ms']:>7} ms  {row['requests_per_s']:>7} req/s  errors {row['errors']}",
+                  file=sys.stderr)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
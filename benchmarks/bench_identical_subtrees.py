@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""Body comparison with identical subtrees skipped, against the original comparator.
+
+The original compare_json_values walked every node of both bodies in
+Python. The current comparator skips identical subtrees: == rules out
+changed ones in C, marshal confirms equal ones, and aligned lists skip
+items whose serializations already matched during alignment. This
+times both on mostly unchanged bodies (one leaf changed, or none) of
+three shapes: a long list of small records, fewer large records, and
+one wide object.
+
+    python benchmarks/bench_identical_subtrees.py --items 50000 --repeat 5
+"""
+import argparse
+import copy
+import json
+import os
+import random
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from server import compare_json_values  # noqa: E402
+
+LABELS = ("before", "after")
+
+
+def original_compare(value1, value2, label1, label2):
+    """compare_json_values as it was before subtrees were skipped"""
+    if type(value1) != type(value2):
+        return {"type": "value_mismatch", label1: value1, label2: value2}
+
+    if isinstance(value1, dict):
+        differences = {}
+        for key in set(value1.keys()) | set(value2.keys()):
+            if key not in value1:
+                differences[key] = {"type": "value_mismatch", label1: None, label2: value2[key]}
+            elif key not in value2:
+                differences[key] = {"type": "value_mismatch", label1: value1[key], label2: None}
+            else:
+                nested_diff = original_compare(value1[key], value2[key], label1, label2)
+                if nested_diff:
+                    differences[key] = nested_diff
+        return differences if differences else None
+
+    if isinstance(value1, list):
+        if len(value1) != len(value2):
+            return {"type": "value_mismatch", label1: value1, label2: value2}
+        differences = {}
+        for i, (item1, item2) in enumerate(zip(value1, value2)):
+            nested_diff = original_compare(item1, item2, label1, label2)
+            if nested_diff:
+                differences[str(i)] = nested_diff
+        return differences if differences else None
+
+    if value1 != value2:
+        return {"type": "value_mismatch", label1: value1, label2: value2}
+    return None
+
+
+def small_records(count):
+    """A page of small catalogue records"""
+    return {"data": {"items": [
+        {"id": i, "name": f"item-{i}", "price": i * 1.25, "tags": ["a", "b"], "stock": {"warehouse": i % 7, "count": i % 13}}
+        for i in range(count)
+    ]}}
+
+
+def large_records(count):
+    """Records of about 1.4 KB each"""
+    rng = random.Random(0)
+    return {"data": [
+        {"id": i, "fields": {f"k{j}": "".join(rng.choice("abcdef") for _ in range(20)) for j in range(40)}}
+        for i in range(count)
+    ]}
+
+
+def wide_object(count):
+    """One object with count keys"""
+    return {f"key{i}": {"value": i, "state": "ok"} for i in range(count)}
+
+
+def with_change(body, path):
+    """A copy of body with the leaf at path changed"""
+    changed = copy.deepcopy(body)
+    node = changed
+    for segment in path[:-1]:
+        node = node[segment]
+    node[path[-1]] = "changed"
+    return changed
+
+
+def best_of(repeat, funcs):
+    """Return the fastest of several timed calls of each function, in seconds
+
+    The functions take turns, so drift in machine load affects them alike.
+    """
+    best = [None] * len(funcs)
+    for _ in range(repeat):
+        for n, func in enumerate(funcs):
+            start = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - start
+            best[n] = elapsed if best[n] is None else min(best[n], elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=50000,
+                        help='Records in the small-record list; the large-record list has a tenth, '
+                             'the wide object twice as many keys')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Timed runs per measurement (the fastest is reported)')
+    args = parser.parse_args()
+
+    small = small_records(args.items)
+    large = large_records(max(args.items // 10, 1))
+    wide = wide_object(2 * args.items)
+    workloads = [
+        ("small records, 1 change", small, with_change(small, ["data", "items", args.items // 2, "name"])),
+        ("large records, 1 change", large, with_change(large, ["data", len(large["data"]) // 2, "fields", "k7"])),
+        ("wide object, 1 change", wide, with_change(wide, [f"key{args.items}", "state"])),
+        ("small records, unchanged", small, copy.deepcopy(small))
+    ]
+
+    results = []
+    for name, before, after in workloads:
+        aligned = lambda: compare_json_values(before, after, *LABELS)  # noqa: E731
+        positional = lambda: compare_json_values(before, after, *LABELS, {"array_diff": "positional"})  # noqa: E731
+        original = lambda: original_compare(before, after, *LABELS)  # noqa: E731
+        assert positional() == original(), f"{name}: positional comparison disagrees with the original"
+        original_s, positional_s, aligned_s = best_of(args.repeat, [original, positional, aligned])
+        row = {
+            "workload": name,
+            "original_ms": round(original_s * 1000, 1),
+            "positional_ms": round(positional_s * 1000, 1),
+            "aligned_ms": round(aligned_s * 1000, 1)
+        }
+        results.append(row)
+        print(f"{name:>26}  original {row['original_ms']:>8} ms  positional {row['positional_ms']:>8} ms "
+              f"({original_s / positional_s:.1f}x)  aligned {row['aligned_ms']:>8} ms "
+              f"({original_s / aligned_s:.1f}x)", file=sys.stderr)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
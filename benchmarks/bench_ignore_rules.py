@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Body comparison with and without ignore rules for volatile fields.
+
+Every item of a long list carries a timestamp and a trace id that
+change between captures. Without rules each one is a difference; with
+rules ignoring them the bodies compare equal. A second case inserts one
+item: alignment leaves the ignored fields out of the item tokens, so
+the insertion is one "added" record instead of a mismatch per shifted
+item.
+
+    python benchmarks/bench_ignore_rules.py --items 20000 --repeat 5
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from server import compare_json_values  # noqa: E402
+from ignore_rules import IgnoreRules  # noqa: E402
+
+LABELS = ("before", "after")
+
+
+def volatile_body(count, rng):
+    """A list of records whose ts and trace_id differ on every call"""
+    return {"items": [
+        {"id": i, "name": f"item-{i}", "price": i * 1.25, "ts": rng.random(), "trace_id": f"{rng.getrandbits(64):016x}"}
+        for i in range(count)
+    ]}
+
+
+def leaf_records(difference):
+    """The records of a nested difference, as (path, record) pairs"""
+    if difference is None:
+        return []
+    if "type" in difference and isinstance(difference.get("type"), str):
+        return [((), difference)]
+    return [((key,) + path, record) for key, nested in difference.items() for path, record in leaf_records(nested)]
+
+
+def best_of(repeat, func):
+    """The fastest of several timed calls, in seconds"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=20000,
+                        help='Records in each body')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Timed runs per measurement (the fastest is reported)')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    rules = IgnoreRules(pointers=["/**/ts", "/**/trace_id"])
+    before, after = volatile_body(args.items, rng), volatile_body(args.items, rng)
+    inserted = volatile_body(args.items, rng)
+    inserted["items"].insert(args.items // 2, {"id": -1, "name": "new", "price": 0.0, "ts": 0.0, "trace_id": "0"})
+
+    results = []
+    for name, other in (("volatile fields", after), ("volatile fields, 1 insert", inserted)):
+        plain = compare_json_values(before, other, *LABELS)
+        ignored = compare_json_values(before, other, *LABELS, {"ignore": rules})
+        records = leaf_records(ignored)
+        if other is inserted:
+            assert len(records) == 1 and records[0][1].get("change") == "added", \
+                f"{name}: expected one added record, got {len(records)}"
+        else:
+            assert not records, f"{name}: expected no differences, got {len(records)}"
+        row = {
+            "workload": name,
+            "plain_ms": round(best_of(args.repeat, lambda: compare_json_values(before, other, *LABELS)) * 1000, 1),
+            "ignored_ms": round(best_of(args.repeat, lambda: compare_json_values(
+                before, other, *LABELS, {"ignore": rules})) * 1000, 1),
+            "plain_records": len(leaf_records(plain)),
+            "plain_bytes": len(json.dumps(plain)),
+            "ignored_records": len(records),
+            "ignored_bytes": len(json.dumps(ignored)) if ignored else 0
+        }
+        results.append(row)
+        print(f"{name:>26}  without rules {row['plain_ms']:>8} ms {row['plain_records']:>7} records  "
+              f"with rules {row['ignored_ms']:>8} ms {row['ignored_records']:>3} records", file=sys.stderr)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
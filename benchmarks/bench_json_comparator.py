@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""Explicit-stack body comparator against the recursive walk it replaced.
+
+Times both walks on a wide body (a long list of records, some edited),
+on a body where every record differs, so every object and array is
+walked, and on deeply nested GraphQL-style bodies. It checks that they
+find the same differences and reports how much slower or faster the
+explicit stack is. It also shows what happens past the recursion limit:
+the recursive walk raises RecursionError, the iterative one stops at
+max_depth and marks the result truncated.
+
+    python benchmarks/bench_json_comparator.py --items 20000 --depth 200 --bodies 20
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import server  # noqa: E402
+from server import (_DESCEND, _MISMATCH, ALIGN_MIN_LENGTH, _classify, _value_mismatch,  # noqa: E402
+                    align_arrays, nest_differences)
+
+
+def recursive_diff(values, labels, path, records, options):
+    """The recursive walk as it was before the explicit stack"""
+    first = values[0]
+    if isinstance(first, dict):
+        all_keys = first
+        for value in values:
+            if value.keys() != first.keys():
+                all_keys = dict.fromkeys(first)
+                for other in values:
+                    all_keys.update(dict.fromkeys(other))
+                break
+        for key in all_keys:
+            try:
+                children = [value[key] for value in values]
+            except KeyError:
+                record = _value_mismatch(labels, [value.get(key) for value in values])
+                record["change"] = "removed" if key in first else "added"
+                records.append((path + (key,), record))
+                continue
+            state = _classify(children)
+            if state == _DESCEND:
+                recursive_diff(children, labels, path + (key,), records, options)
+            elif state == _MISMATCH:
+                records.append((path + (key,), _value_mismatch(labels, children)))
+        return
+
+    size = len(first)
+    same_length = all(len(value) == size for value in values)
+    if options.get("array_diff", "aligned") == "aligned" and (not same_length or size >= ALIGN_MIN_LENGTH):
+        rows, tokens = align_arrays(values, options.get("array_key"))
+        for row in rows:
+            if None not in row:
+                if tokens is not None and all(other[i] == tokens[0][row[0]] for other, i in zip(tokens[1:], row[1:])):
+                    continue
+                children = [value[i] for value, i in zip(values, row)]
+                segment = row[0]
+                state = _classify(children)
+                if state == _DESCEND:
+                    recursive_diff(children, labels, path + (segment,), records, options)
+                elif state == _MISMATCH:
+                    record = _value_mismatch(labels, children)
+                    if any(i != segment for i in row):
+                        record["change"] = "changed"
+                        record["indices"] = dict(zip(labels, row))
+                    records.append((path + (segment,), record))
+                continue
+            if row[0] is not None:
+                segment = row[0]
+                change = "removed"
+            else:
+                owner = next(n for n, i in enumerate(row) if i is not None)
+                segment = f"+{labels[owner]}:{row[owner]}"
+                change = "added"
+            record = _value_mismatch(labels, [value[i] if i is not None else None for value, i in zip(values, row)])
+            record["change"] = change
+            record["indices"] = dict(zip(labels, row))
+            records.append((path + (segment,), record))
+        return
+
+    if not same_length:
+        records.append((path, _value_mismatch(labels, values)))
+        return
+    for i, children in enumerate(zip(*values)):
+        state = _classify(children)
+        if state == _DESCEND:
+            recursive_diff(children, labels, path + (i,), records, options)
+        elif state == _MISMATCH:
+            records.append((path + (i,), _value_mismatch(labels, children)))
+
+
+def recursive_compare(values, labels, options):
+    records = []
+    recursive_diff(values, labels, (), records, options)
+    return nest_differences(records)
+
+
+def iterative_compare(values, labels, options):
+    return server.compare_json_values_nway(values, labels, options)
+
+
+def wide_body(rng, items, changed):
+    """A list of catalogue records; changed marks some of them as edited"""
+    return {"data": {"items": [
+        {
+            "id": i,
+            "name": f"item-{i}",
+            "price": round(i * 1.25 + (rng.random() if changed and i % 10 == 0 else 0), 2),
+            "tags": ["a", "b", "c"] if not (changed and i % 25 == 0) else ["a", "c"],
+            "stock": {"warehouse": i % 7, "count": i % 13}
+        } for i in range(items)
+    ]}}
+
+
+def changed_body(items, version):
+    """Records whose leaves all change with version, so nothing can be skipped"""
+    return {"items": [
+        {"id": i, "price": {"amount": version, "history": [version, i]}, "stock": {"warehouse": {"count": version}}}
+        for i in range(items)
+    ]}
+
+
+def nested_body(depth, leaf):
+    """A GraphQL-style chain of edges/node objects depth levels deep"""
+    body = {"value": leaf, "cursor": "end"}
+    for level in range(depth):
+        body = {"edges": [{"node": body, "cursor": f"c{level}"}], "pageInfo": {"hasNextPage": level % 2 == 0}}
+    return {"data": body}
+
+
+def best_of(repeat, funcs):
+    """Return the fastest of several timed calls of each function, in seconds
+
+    The functions take turns, so drift in machine load affects them alike.
+    """
+    best = [None] * len(funcs)
+    for _ in range(repeat):
+        for n, func in enumerate(funcs):
+            start = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - start
+            best[n] = elapsed if best[n] is None else min(best[n], elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=20000,
+                        help='Records in the wide body (a quarter as many in the changed body)')
+    parser.add_argument('--depth', type=int, default=200,
+                        help='Nesting levels of the nested bodies (edges/node pairs)')
+    parser.add_argument('--bodies', type=int, default=20,
+                        help='Nested body pairs compared per run')
+    parser.add_argument('--repeat', type=int, default=7,
+                        help='Timed runs per measurement (the fastest is reported)')
+    args = parser.parse_args()
+
+    labels = ["before", "after"]
+    # Deep enough for every workload, so both walks see the same bodies
+    options = {"max_depth": 10 * args.depth + 10}
+    rng = random.Random(0)
+    wide = [wide_body(rng, args.items, False), wide_body(rng, args.items, True)]
+    changed = [changed_body(args.items // 4, 0), changed_body(args.items // 4, 1)]
+    nested = [[nested_body(args.depth, i), nested_body(args.depth, i + 1)] for i in range(args.bodies)]
+
+    results = []
+    workloads = [
+        ("wide", lambda compare: compare(wide, labels, options)),
+        ("changed", lambda compare: compare(changed, labels, options)),
+        ("nested", lambda compare: [compare(pair, labels, options) for pair in nested])
+    ]
+    for name, run in workloads:
+        assert run(recursive_compare) == run(iterative_compare), f"{name}: walks disagree"
+        recursive_s, iterative_s = best_of(args.repeat, [lambda: run(recursive_compare), lambda: run(iterative_compare)])
+        row = {
+            "workload": name,
+            "recursive_ms": round(recursive_s * 1000, 1),
+            "iterative_ms": round(iterative_s * 1000, 1),
+            "iterative_change_percent": round((iterative_s / recursive_s - 1) * 100, 1)
+        }
+        results.append(row)
+        print(f"{name:>8}  recursive {row['recursive_ms']:>9} ms  iterative {row['iterative_ms']:>9} ms "
+              f"({row['iterative_change_percent']:+.1f}%)", file=sys.stderr)
+
+    # Deeper than the recursion limit allows the recursive walk to go
+    deep = [nested_body(sys.getrecursionlimit(), 0), nested_body(sys.getrecursionlimit(), 1)]
+    try:
+        recursive_compare(deep, labels, {"max_depth": 10 ** 6})
+        recursive_outcome = "completed"
+    except RecursionError:
+        recursive_outcome = "RecursionError"
+    start = time.perf_counter()
+    differences = iterative_compare(deep, labels, {})
+    truncated = '"truncated"' in json.dumps(differences)
+    row = {
+        "workload": f"depth {2 * sys.getrecursionlimit()}",
+        "recursive": recursive_outcome,
+        "iterative": "truncated at max_depth" if truncated else "completed",
+        "iterative_ms": round((time.perf_counter() - start) * 1000, 1)
+    }
+    results.append(row)
+    print(f"{row['workload']:>8}  recursive {recursive_outcome}  iterative {row['iterative']} "
+          f"({row['iterative_ms']} ms)", file=sys.stderr)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""Timings of each stage of the comparison pipeline and the dashboard routes.
+
+Generates synthetic captures (see generate_captures.py) and times
+process_entry, compare_json_values, compare_endpoint_instances,
+compare_api_structures and process_for_dashboard on them, then serves
+the resulting comparison through Flask's test client and times the
+dashboard routes, cold (empty comparison cache) and warm. Each stage
+reports the fastest of --repeat runs; inputs are rebuilt between runs
+so runs never share state.
+
+Save a run with --output and compare a later one against it with
+--compare; stages slower by more than --threshold percent are flagged
+and the exit status is 1.
+
+    python benchmarks/bench_pipeline.py --output before.json
+    python benchmarks/bench_pipeline.py --compare before.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlencode
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from generate_captures import add_generator_arguments, generate_versions, generator_options  # noqa: E402
+from server import (compare_api_structures, compare_endpoint_instances, compare_json_values,  # noqa: E402
+                    extract_endpoints, process_entry)
+from dashboard_ready_comparison import process_for_dashboard  # noqa: E402
+from comparison_format import write_comparison  # noqa: E402
+import simple_dashboard  # noqa: E402
+
+LABELS = ("v1", "v2")
+
+# Stages slower than this many percent against --compare are regressions
+DEFAULT_THRESHOLD = 10.0
+
+
+def time_stage(repeat, run, setup=None):
+    """Return the fastest of repeat timed runs in ms; setup() is untimed and its result passed to run"""
+    best = None
+    for _ in range(repeat):
+        state = setup() if setup is not None else None
+        start = time.perf_counter()
+        run(state)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best * 1000, 2)
+
+
+def parsed_endpoints(entries):
+    """Endpoints of a capture with every body already parsed"""
+    endpoints = extract_endpoints({"data": entries})
+    for endpoint in endpoints.values():
+        endpoint["response_body"].json()
+    return endpoints
+
+
+def pipeline_benchmarks(captures, repeat, options):
+    """Return {stage: ms} for the comparison stages"""
+    first, second = captures[0], captures[1]
+    results = {}
+
+    def extract(_):
+        endpoints = {}
+        for entry in first:
+            process_entry(entry, endpoints)
+        # Bodies are decoded lazily; include decoding as the comparison would
+        for endpoint in endpoints.values():
+            endpoint["response_body"].json()
+    results["process_entry"] = time_stage(repeat, extract)
+
+    def endpoint_pairs():
+        a, b = parsed_endpoints(first), parsed_endpoints(second)
+        return [(a[key], b[key]) for key in a if key in b]
+
+    def compare_bodies(pairs):
+        for a, b in pairs:
+            compare_json_values(a["response_body"].json(), b["response_body"].json(), *LABELS, options)
+    results["compare_json_values"] = time_stage(repeat, compare_bodies, endpoint_pairs)
+
+    def compare_instances(pairs):
+        for a, b in pairs:
+            compare_endpoint_instances(dict(zip(LABELS, (a, b))), "comprehensive", options)
+    results["compare_endpoint_instances"] = time_stage(repeat, compare_instances, endpoint_pairs)
+
+    def compare_structures(file_data):
+        compare_api_structures(file_data, options=options)
+    results["compare_api_structures"] = time_stage(repeat, compare_structures, lambda: [
+        {"endpoints": extract_endpoints({"data": entries}), "file_label": label}
+        for entries, label in zip(captures, LABELS)
+    ])
+
+    comparison = compare_api_structures(
+        [{"data": entries, "file_label": label} for entries, label in zip(captures, LABELS)], options=options)
+    results["process_for_dashboard"] = time_stage(
+        repeat, lambda _: process_for_dashboard(comparison, list(LABELS), {}))
+    return results, process_for_dashboard(comparison, list(LABELS), {})
+
+
+def dashboard_benchmarks(dashboard_data, repeat):
+    """Return {route: ms} for the dashboard routes, cold and warm"""
+    results = {}
+    with tempfile.TemporaryDirectory() as data_dir:
+        filename = "api_comparison_v1-v2_20240101_000000.json"
+        write_comparison(os.path.join(data_dir, filename), dashboard_data, "json", None)
+        simple_dashboard.DATA_DIR = data_dir
+        client = simple_dashboard.app.test_client()
+
+        changed = dashboard_data["summary"]["by_change_type"]["modified"]
+        key = changed[0] if changed else next(iter(dashboard_data["endpoints"]))
+        routes = {
+            "index": "/",
+            "comparison_detail": f"/comparison/{filename}",
+            "api_comparison": f"/api/comparison/{filename}",
+            "api_endpoints": f"/api/endpoints?file={filename}&fields=method,path,status",
+            "api_endpoints_page": f"/api/endpoints?file={filename}&status=changed&limit=50",
+            "api_endpoint": "/api/endpoint?" + urlencode({"file": filename, "key": key})
+        }
+
+        def request(url):
+            response = client.get(url)
+            assert response.status_code == 200, f"{url}: {response.status_code}"
+            response.get_data()
+
+        for name, url in routes.items():
+            results[f"route_{name}_cold"] = time_stage(
+                repeat, lambda _: request(url), simple_dashboard.comparison_cache.clear)
+            request(url)
+            results[f"route_{name}_warm"] = time_stage(repeat, lambda _: request(url))
+    return results
+
+
+def environment():
+    """Where the run happened, so saved results can be told apart"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "commit": commit,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S")
+    }
+
+
+def compare_results(previous, current, threshold):
+    """Print each stage against a previous run; return the stages slower by more than threshold percent"""
+    if previous.get("parameters") != current["parameters"]:
+        print("Warning: the runs used different parameters", file=sys.stderr)
+    regressions = []
+    for stage, ms in current["results"].items():
+        before = previous.get("results", {}).get(stage)
+        if not before:
+            print(f"{stage:>32}  {ms:>10} ms  (new)", file=sys.stderr)
+            continue
+        change = (ms - before) / before * 100
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(stage)
+        print(f"{stage:>32}  {before:>10} -> {ms:>10} ms  {change:+7.1f}%{flag}", file=sys.stderr)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_generator_arguments(parser)
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Timed runs per stage (the fastest is reported)')
+    parser.add_argument('--array-diff', type=str, default="aligned", choices=["aligned", "positional"],
+                        help='List comparison mode passed to the comparator')
+    parser.add_argument('--output', type=str, default=None,
+                        help='Save the results to this JSON file')
+    parser.add_argument('--compare', type=str, default=None,
+                        help='Results JSON of an earlier run to check for regressions')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Percent slowdown against --compare reported as a regression')
+    args = parser.parse_args()
+    if args.versions < 2:
+        parser.error("--versions must be at least 2")
+
+    parameters = dict(generator_options(args), repeat=args.repeat, array_diff=args.array_diff)
+    captures = generate_versions(**generator_options(args))[:2]
+    options = {"array_diff": args.array_diff}
+
+    results, dashboard_data = pipeline_benchmarks(captures, args.repeat, options)
+    results.update(dashboard_benchmarks(dashboard_data, args.repeat))
+    run = {"environment": environment(), "parameters": parameters, "results": results}
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(run, f, indent=2)
+    print(json.dumps(run, indent=2))
+
+    if not args.compare:
+        for stage, ms in results.items():
+            print(f"{stage:>32}  {ms:>10} ms", file=sys.stderr)
+        return
+    with open(args.compare, 'r') as f:
+        previous = json.load(f)
+    if compare_results(previous, run, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
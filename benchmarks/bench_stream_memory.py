@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Peak RSS of loading a capture with json.load versus streaming it.
+
+Generates captures of increasing size that all hit the same set of
+endpoints, then runs compare_api_structures on each in a fresh
+subprocess and reports the child's peak resident set size.
+
+    python benchmarks/bench_stream_memory.py --sizes-mb 10 50 200
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Child program: run one comparison and print peak RSS in bytes
+CHILD = r"""
+import json, resource, sys
+sys.path.insert(0, {repo!r})
+from server import compare_api_structures
+from capture_stream import iter_capture_entries
+
+mode, path = sys.argv[1], sys.argv[2]
+if mode == "load":
+    with open(path) as f:
+        item = {{"data": json.load(f), "file_label": "capture"}}
+else:
+    item = {{"entries": iter_capture_entries(path), "file_label": "capture"}}
+compare_api_structures([item])
+
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+# ru_maxrss is kilobytes on Linux and bytes on macOS
+print(peak if sys.platform == "darwin" else peak * 1024)
+"""
+
+
+def write_capture(path, size_mb, endpoint_count):
+    """Write a list-form capture of roughly size_mb megabytes"""
+    target = size_mb * 1024 * 1024
+    written = 0
+    i = 0
+    with open(path, 'w') as f:
+        f.write("[")
+        while written < target:
+            entry = {
+                "method": "GET",
+                "url": f"https://api.example.com/v1/items/{i % endpoint_count}",
+                "status": 200,
+                "response_body": {
+                    "id": i,
+                    "items": [{"sku": f"sku-{i}-{j}", "price": j * 1.25} for j in range(20)]
+                }
+            }
+            chunk = ("," if i else "") + json.dumps(entry)
+            f.write(chunk)
+            written += len(chunk)
+            i += 1
+        f.write("]")
+
+
+def peak_rss(mode, path):
+    """Run the child program and return its peak RSS in bytes"""
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD.format(repo=REPO_DIR), mode, path],
+        check=True, capture_output=True, text=True
+    )
+    return int(out.stdout.strip())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes-mb', type=int, nargs='+', default=[10, 50, 100],
+                        help='Capture sizes to generate, in megabytes')
+    parser.add_argument('--endpoints', type=int, default=200,
+                        help='Number of distinct endpoints in each capture')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size_mb in args.sizes_mb:
+            path = os.path.join(tmp, f"capture_{size_mb}mb.json")
+            write_capture(path, size_mb, args.endpoints)
+            row = {
+                "file_mb": round(os.path.getsize(path) / 1024 / 1024, 1),
+                "json_load_rss_mb": round(peak_rss("load", path) / 1024 / 1024, 1),
+                "stream_rss_mb": round(peak_rss("stream", path) / 1024 / 1024, 1)
+            }
+            results.append(row)
+            print(f"{row['file_mb']:>8} MB file  json.load {row['json_load_rss_mb']:>8} MB  "
+                  f"stream {row['stream_rss_mb']:>8} MB", file=sys.stderr)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
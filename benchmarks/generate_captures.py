@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""Deterministic synthetic Charles exports for benchmarks.
+
+Writes one capture per version of the same API. Every endpoint returns
+a JSON body with a list of records (array length), each with scalar
+fields (body size) and a chain of nested objects (nesting depth).
+Between consecutive versions a mutation rate of the leaf values change,
+list items are inserted or dropped, and endpoints are added or
+removed; Date and X-Request-Id headers differ on every request, as in
+real captures. The same arguments always produce the same files.
+
+    python benchmarks/generate_captures.py --output-dir /tmp/captures \\
+        --endpoints 500 --versions 2 --array-length 20 --depth 4 --mutation-rate 0.05
+"""
+import argparse
+import copy
+import json
+import os
+import random
+import sys
+
+HOSTS = ("api.example.com", "auth.example.com", "search.example.com")
+RESOURCES = ("users", "orders", "products", "carts", "reviews", "payments", "shipments", "coupons")
+WORDS = ("alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel", "india", "juliet")
+
+
+def _scalar(rng, field):
+    """A leaf value whose type depends on the field position"""
+    kind = field % 4
+    if kind == 0:
+        return rng.randrange(1_000_000)
+    if kind == 1:
+        return round(rng.uniform(0, 1000), 2)
+    if kind == 2:
+        return " ".join(rng.choice(WORDS) for _ in range(3))
+    return rng.random() < 0.5
+
+
+def _nested(rng, depth, fields):
+    """A chain of depth objects, each with a few scalar fields"""
+    node = {f"f{field}": _scalar(rng, field) for field in range(fields)}
+    for level in range(depth):
+        node = {"level": level, "meta": {"tag": rng.choice(WORDS)}, "child": node}
+    return node
+
+
+def build_body(rng, array_length, fields, depth):
+    """A response body: a page of records plus paging information"""
+    items = []
+    for i in range(array_length):
+        item = {"id": i, "name": f"{rng.choice(WORDS)}-{i}"}
+        item.update({f"f{field}": _scalar(rng, field) for field in range(fields)})
+        if depth:
+            item["details"] = _nested(rng, depth, max(1, fields // 2))
+        items.append(item)
+    return {"data": {"items": items}, "paging": {"total": array_length, "next": None}}
+
+
+def mutate(rng, value, rate):
+    """Return a copy of value with about rate of its leaves and lists changed"""
+    if isinstance(value, dict):
+        return {key: mutate(rng, child, rate) if key != "id" else child for key, child in value.items()}
+    if isinstance(value, list):
+        items = [mutate(rng, item, rate) for item in value]
+        if items and rng.random() < rate:
+            if rng.random() < 0.5:
+                del items[rng.randrange(len(items))]
+            else:
+                position = rng.randrange(len(items) + 1)
+                items.insert(position, copy.deepcopy(items[rng.randrange(len(items))]))
+        return items
+    if rng.random() >= rate:
+        return value
+    if isinstance(value, bool):
+        return not value
+    if isinstance(value, int):
+        return value + rng.randrange(1, 100)
+    if isinstance(value, float):
+        return round(value * rng.uniform(0.5, 1.5), 2)
+    if isinstance(value, str):
+        return f"{value} {rng.choice(WORDS)}"
+    return value
+
+
+def _endpoint(index):
+    """(host, path) of the index-th endpoint"""
+    host = HOSTS[index % len(HOSTS)]
+    resource = RESOURCES[index % len(RESOURCES)]
+    return host, f"/v1/{resource}/{index}"
+
+
+def _entry(rng, host, path, body, version):
+    """One capture entry in the form process_entry reads"""
+    return {
+        "method": "GET",
+        "url": f"https://{host}{path}?page=1",
+        "status": 200,
+        "duration": rng.randrange(5, 800),
+        "request": {
+            "headers": {
+                "Accept": "application/json",
+                "User-Agent": f"ExampleApp/{version}",
+                "Date": f"Mon, 01 Jan 2024 00:{rng.randrange(60):02d}:{rng.randrange(60):02d} GMT",
+                "X-Request-Id": f"{rng.getrandbits(64):016x}"
+            }
+        },
+        "response": {
+            "status": 200,
+            "headers": {"Content-Type": "application/json"},
+            # Charles stores bodies as text
+            "body": json.dumps(body)
+        }
+    }
+
+
+def generate_versions(endpoints=200, versions=2, array_length=20, fields=8, depth=3, mutation_rate=0.05, seed=0):
+    """Return one list of capture entries per version
+
+    Version n is version n-1 with mutation_rate applied; about a tenth
+    of the mutation rate of endpoints are removed and as many added.
+    """
+    bodies = {}
+    for index in range(endpoints):
+        rng = random.Random(f"{seed}:body:{index}")
+        bodies[index] = build_body(rng, array_length, fields, depth)
+
+    captures = []
+    next_index = endpoints
+    for version in range(versions):
+        if version:
+            rng = random.Random(f"{seed}:version:{version}")
+            for index in list(bodies):
+                if rng.random() < mutation_rate / 10:
+                    del bodies[index]
+                else:
+                    bodies[index] = mutate(rng, bodies[index], mutation_rate)
+            for _ in range(sum(rng.random() < mutation_rate / 10 for _ in range(endpoints))):
+                bodies[next_index] = build_body(rng, array_length, fields, depth)
+                next_index += 1
+
+        rng = random.Random(f"{seed}:entries:{version}")
+        captures.append([
+            _entry(rng, *_endpoint(index), body, f"{version + 1}.0")
+            for index, body in bodies.items()
+        ])
+    return captures
+
+
+def write_captures(output_dir, captures):
+    """Write captures as v1_capture.json, v2_capture.json, ... and return their paths"""
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+    for version, entries in enumerate(captures, 1):
+        path = os.path.join(output_dir, f"v{version}_capture.json")
+        with open(path, 'w') as f:
+            json.dump(entries, f)
+        paths.append(path)
+    return paths
+
+
+def add_generator_arguments(parser):
+    """Add the capture shape options shared with bench_pipeline.py"""
+    parser.add_argument('--endpoints', type=int, default=200,
+                        help='Endpoints in the first version')
+    parser.add_argument('--versions', type=int, default=2,
+                        help='Captures to generate, each a mutation of the previous one')
+    parser.add_argument('--array-length', type=int, default=20,
+                        help='Records in each response body')
+    parser.add_argument('--fields', type=int, default=8,
+                        help='Scalar fields per record (body size)')
+    parser.add_argument('--depth', type=int, default=3,
+                        help='Nested object levels under each record')
+    parser.add_argument('--mutation-rate', type=float, default=0.05,
+                        help='Fraction of values, lists and endpoints changed between versions')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed; the same arguments and seed give the same captures')
+
+
+def generator_options(args):
+    return {
+        "endpoints": args.endpoints,
+        "versions": args.versions,
+        "array_length": args.array_length,
+        "fields": args.fields,
+        "depth": args.depth,
+        "mutation_rate": args.mutation_rate,
+        "seed": args.seed
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--output-dir', type=str, required=True,
+                        help='Directory to write the captures to')
+    add_generator_arguments(parser)
+    args = parser.parse_args()
+
+    paths = write_captures(args.output_dir, generate_versions(**generator_options(args)))
+    for path in paths:
+        print(f"{path}  {os.path.getsize(path) / 1e6:.1f} MB", file=sys.stderr)
+    print(json.dumps(paths))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+import gzip
+import hashlib
+import json
+import os
+import re
+from atomic_files import atomic_open
+
+# Directory under the dashboard data dir holding the blobs
+BLOB_DIR_NAME = "blobs"
+
+# Digests look like "sha256:<64 hex chars>"
+DIGEST_RE = re.compile(r"^sha256:([0-9a-f]{64})$")
+
+
+def encode_json(value):
+    """Encode a value the way it is hashed: compact JSON as UTF-8 bytes"""
+    return json.dumps(value, separators=(",", ":")).encode("utf-8", "surrogatepass")
+
+
+def digest_bytes(data):
+    """Return the "sha256:<hex>" digest of some bytes"""
+    return f"sha256:{hashlib.sha256(data).hexdigest()}"
+
+
+def blob_path(store_dir, digest):
+    """Return the file holding a digest, fanned out by its first two hex chars"""
+    match = DIGEST_RE.match(digest)
+    if not match:
+        raise ValueError(f"Invalid blob digest: {digest}")
+    hex_digest = match.group(1)
+    return os.path.join(store_dir, hex_digest[:2], hex_digest[2:] + ".gz")
+
+
+def put_blob(store_dir, data, digest=None):
+    """Store bytes gzip-compressed under their digest and return the digest
+
+    Content that is already stored is not written again, so storing the
+    same body from many comparisons costs one hash and one stat.
+    """
+    digest = digest or digest_bytes(data)
+    path = blob_path(store_dir, digest)
+    if os.path.exists(path):
+        return digest
+
+    blob_dir = os.path.dirname(path)
+    os.makedirs(blob_dir, exist_ok=True)
+    with atomic_open(path) as f:
+        f.write(gzip.compress(data, compresslevel=6, mtime=0))
+    return digest
+
+
+def put_json(store_dir, value):
+    """Store a JSON value and return its digest"""
+    return put_blob(store_dir, encode_json(value))
+
+
+def read_blob(store_dir, digest, decompress=True):
+    """Return the bytes stored under a digest (gzip-compressed if decompress is False)
+
+    Raises FileNotFoundError if the digest is not in the store.
+    """
+    with open(blob_path(store_dir, digest), "rb") as f:
+        data = f.read()
+    return gzip.decompress(data) if decompress else data
+
+
+def get_json(store_dir, digest):
+    """Load the JSON value stored under a digest"""
+    return json.loads(read_blob(store_dir, digest))
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+import json
+
+# Characters read from disk per refill
+CHUNK_SIZE = 1 << 20
+
+_WHITESPACE = " \t\n\r"
+_NUMBER_CHARS = "0123456789+-.eE"
+_decoder = json.JSONDecoder()
+
+
+class _JsonStream:
+    """Incremental reader over a JSON text file with a sliding buffer"""
+
+    def __init__(self, f, chunk_size=CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.offset = 0  # Absolute character offset of buf[0]
+        self.eof = False
+
+    def _fill(self, min_chars=None):
+        """Read more data, dropping the consumed prefix of the buffer"""
+        if self.pos:
+            self.offset += self.pos
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+        chunk = self.f.read(max(self.chunk_size, min_chars or 0))
+        if not chunk:
+            self.eof = True
+        self.buf += chunk
+
+    def peek(self):
+        """Return the next non-whitespace character without consuming it"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if self.eof:
+                return ""
+            self._fill()
+
+    def expect(self, chars):
+        """Consume the next character, which must be one of chars"""
+        ch = self.peek()
+        if not ch or ch not in chars:
+            self.error(f"Expecting one of {chars!r}")
+        self.pos += 1
+        return ch
+
+    def decode(self):
+        """Decode one complete JSON value at the current position"""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                # Value is split across the buffer; grow it geometrically so
+                # large values are not re-scanned over and over
+                self._fill(len(self.buf))
+                continue
+            # A number cut at the buffer edge decodes as a shorter number
+            # (e.g. "1." parses as 1), so make sure it is followed by data
+            if not self.eof and isinstance(value, (int, float)) and not isinstance(value, bool):
+                tail = end
+                while tail < len(self.buf) and self.buf[tail] in _NUMBER_CHARS:
+                    tail += 1
+                if tail == len(self.buf):
+                    self._fill(len(self.buf))
+                    continue
+            self.pos = end
+            return value
+
+    def error(self, msg):
+        raise json.JSONDecodeError(msg, self.buf, self.pos)
+
+
+def iter_capture_entries(file_path, chunk_size=CHUNK_SIZE):
+    """Yield the entries of a Charles export one at a time.
+
+    Accepts the same shapes as compare_api_structures: a top-level list of
+    entries, an object with an "entries" list, or a single entry object.
+    Only one entry is held in memory at a time.
+    """
+    with open(file_path, 'r') as f:
+        stream = _JsonStream(f, chunk_size)
+        try:
+            yield from _iter_document(stream)
+        except json.JSONDecodeError as e:
+            raise json.JSONDecodeError(
+                f"{e.msg} in {file_path} (char {stream.offset + e.pos})", e.doc, e.pos
+            ) from None
+
+
+def _iter_document(stream):
+    """Dispatch on the top-level JSON shape"""
+    first = stream.peek()
+    if first == "[":
+        yield from _iter_array(stream)
+    elif first == "{":
+        yield from _iter_object(stream)
+    else:
+        # Scalars carry no entries, but must still be valid JSON
+        stream.decode()
+
+    if stream.peek():
+        stream.error("Extra data")
+
+
+def _iter_array(stream):
+    """Yield the items of the array at the current position"""
+    stream.expect("[")
+    if stream.peek() == "]":
+        stream.pos += 1
+        return
+    while True:
+        yield stream.decode()
+        if stream.expect(",]") == "]":
+            return
+
+
+def _iter_object(stream):
+    """Stream the "entries" list of an object, or yield the object itself"""
+    stream.expect("{")
+    rest = {}
+    has_entries = False
+
+    if stream.peek() == "}":
+        stream.pos += 1
+    else:
+        while True:
+            if stream.peek() != '"':
+                stream.error("Expecting property name enclosed in double quotes")
+            key = stream.decode()
+            stream.expect(":")
+
+            if key == "entries" and not has_entries:
+                has_entries = True
+                if stream.peek() == "[":
+                    yield from _iter_array(stream)
+                else:
+                    yield from stream.decode()
+            elif has_entries:
+                # Sibling keys are irrelevant once entries were seen
+                stream.decode()
+            else:
+                rest[key] = stream.decode()
+
+            if stream.expect(",}") == "}":
+                break
+
+    # An object without entries is treated as a single entry
+    if not has_entries:
+        yield rest
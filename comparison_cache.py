@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+import os
+import threading
+from collections import OrderedDict
+
+# Default memory budget of the cache
+DEFAULT_CACHE_MB = 512
+
+# Parsed JSON takes roughly this many times its file size in memory
+PARSED_SIZE_FACTOR = 5
+
+
+class ComparisonCache:
+    """Thread-safe LRU cache of values loaded from comparison files
+
+    Entries are keyed by (kind, path, mtime, size), so a rewritten file is
+    loaded again, and weighed by their estimated in-memory size. The least
+    recently used entries are evicted once the total passes max_bytes;
+    values larger than the whole budget are returned without being cached.
+    Concurrent misses on the same entry load it only once.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (value, cost), least recent first
+        self._bytes = 0
+        self._loading = {}  # key -> Event set when the load finishes
+        self._lock = threading.Lock()
+
+    def get(self, path, loader, kind="comparison", weigh=None):
+        """Return loader(path), from the cache when the file is unchanged
+
+        weigh(path) estimates a new entry's size in bytes; by default the
+        file is weighed as parsed JSON.
+        """
+        stat = os.stat(path)
+        key = (kind, path, stat.st_mtime_ns, stat.st_size)
+
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                loading = self._loading.get(key)
+                if loading is None:
+                    self.misses += 1
+                    loading = self._loading[key] = threading.Event()
+                    break
+            # Another thread is loading this entry; use its result
+            loading.wait()
+
+        try:
+            value = loader(path)
+        finally:
+            with self._lock:
+                del self._loading[key]
+            loading.set()
+
+        cost = stat.st_size * PARSED_SIZE_FACTOR if weigh is None else weigh(path)
+        self._store(key, value, cost)
+        return value
+
+    def _store(self, key, value, cost):
+        """Insert an entry and evict least recently used ones over budget"""
+        if cost > self.max_bytes:
+            return
+        with self._lock:
+            # Older versions of the same file can never be hit again
+            for stale in [k for k in self._entries if k[:2] == key[:2]]:
+                self._bytes -= self._entries.pop(stale)[1]
+            self._entries[key] = (value, cost)
+            self._bytes += cost
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_cost) = self._entries.popitem(last=False)
+                self._bytes -= evicted_cost
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every entry (counters are kept)"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Return the hit/miss counters and current size"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes
+            }
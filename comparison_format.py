@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+import json
+import os
+from atomic_files import atomic_open
+
+# Binary formats and compression are optional
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Formats a comparison can be written in besides SQLite
+FILE_FORMATS = ("json", "msgpack", "cbor")
+FORMAT_SUFFIXES = {"json": ".json", "msgpack": ".msgpack", "cbor": ".cbor"}
+ZSTD_SUFFIX = ".zst"
+
+# File names the dashboard reads as comparisons (zstd-compressed or not)
+COMPARISON_SUFFIXES = tuple(FORMAT_SUFFIXES.values()) + tuple(s + ZSTD_SUFFIX for s in FORMAT_SUFFIXES.values())
+
+# Compression level for zstd output; higher levels cost write time for little gain
+ZSTD_LEVEL = 9
+
+# Every zstd frame starts with these bytes
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+# Decoded size per encoded byte relative to JSON (measured on dashboard data)
+DECODED_SIZE_RATIOS = {"json": 1, "msgpack": 2.5, "cbor": 3.5}
+
+# Assumed compression ratio of a zstd file whose frame does not record its size
+ZSTD_ASSUMED_RATIO = 10
+
+
+class ComparisonFormatError(ValueError):
+    """A comparison file cannot be decoded"""
+
+
+def comparison_suffix(file_format="json", compression=None):
+    """Return the file suffix for a format, e.g. .msgpack.zst"""
+    suffix = FORMAT_SUFFIXES[file_format]
+    return suffix + ZSTD_SUFFIX if compression == "zstd" else suffix
+
+
+def missing_dependency(file_format="json", compression=None):
+    """Return the name of the package a format needs but is not installed, or None"""
+    if file_format == "msgpack" and msgpack is None:
+        return "msgpack"
+    if file_format == "cbor" and cbor2 is None:
+        return "cbor2"
+    if compression == "zstd" and zstandard is None:
+        return "zstandard"
+    return None
+
+
+def encode_comparison(data, file_format="json", compression=None):
+    """Encode comparison data as bytes in the given format"""
+    if file_format == "msgpack":
+        # surrogatepass keeps lone surrogates from captured bodies, as JSON does
+        encoded = msgpack.packb(data, use_bin_type=True, unicode_errors="surrogatepass")
+    elif file_format == "cbor":
+        encoded = cbor2.dumps(data)
+    else:
+        encoded = json.dumps(data, indent=2).encode("utf-8", "surrogatepass")
+    if compression == "zstd":
+        encoded = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(encoded)
+    return encoded
+
+
+def write_comparison(path, data, file_format="json", compression=None):
+    """Write comparison data through a temporary file so readers never see a partial file"""
+    encoded = encode_comparison(data, file_format, compression)
+    with atomic_open(path) as f:
+        f.write(encoded)
+
+
+def decode_comparison(raw):
+    """Decode comparison bytes, detecting zstd and the format from the content
+
+    JSON starts with "{" (or whitespace), MessagePack maps with 0x80-0x8f,
+    0xde or 0xdf and CBOR maps with 0xa0-0xbf, so the leading byte decides.
+    """
+    try:
+        if raw.startswith(ZSTD_MAGIC):
+            if zstandard is None:
+                raise ComparisonFormatError("File is zstd-compressed but zstandard is not installed")
+            raw = zstandard.ZstdDecompressor().decompress(raw)
+        file_format = detect_format(raw)
+        if file_format == "msgpack" and msgpack is None:
+            raise ComparisonFormatError("File is MessagePack but msgpack is not installed")
+        if file_format == "cbor" and cbor2 is None:
+            raise ComparisonFormatError("File is CBOR but cbor2 is not installed")
+        if file_format == "msgpack":
+            return msgpack.unpackb(raw, raw=False, unicode_errors="surrogatepass")
+        if file_format == "cbor":
+            return cbor2.loads(raw)
+        return json.loads(raw)
+    except ComparisonFormatError:
+        raise
+    except Exception as e:
+        # Each decoder raises its own error types for corrupt input
+        raise ComparisonFormatError(f"Invalid comparison file: {e}")
+
+
+def detect_format(raw):
+    """Return "json", "msgpack" or "cbor" from the first byte of uncompressed data"""
+    first = raw[:1]
+    if first and (0x80 <= first[0] <= 0x8f or first[0] in (0xde, 0xdf)):
+        return "msgpack"
+    if first and 0xa0 <= first[0] <= 0xbf:
+        return "cbor"
+    return "json"
+
+
+def json_equivalent_size(path):
+    """Estimate the size of a comparison file as uncompressed JSON
+
+    Memory budgets measured for parsed JSON apply to other formats
+    through this size. It is derived from the file name and the zstd
+    frame header, without decoding the file.
+    """
+    size = os.path.getsize(path)
+    name = path
+    if name.endswith(ZSTD_SUFFIX):
+        name = name[:-len(ZSTD_SUFFIX)]
+        content_size = -1
+        if zstandard is not None:
+            with open(path, 'rb') as f:
+                try:
+                    content_size = zstandard.frame_content_size(f.read(18))
+                except zstandard.ZstdError:
+                    pass
+        size = content_size if content_size >= 0 else size * ZSTD_ASSUMED_RATIO
+    for file_format, suffix in FORMAT_SUFFIXES.items():
+        if name.endswith(suffix):
+            return int(size * DECODED_SIZE_RATIOS[file_format])
+    return size
+
+
+def read_comparison(path):
+    """Read a comparison file in any supported format"""
+    with open(path, 'rb') as f:
+        return decode_comparison(f.read())
+
+
+def read_comparison_metadata(path):
+    """Return only the metadata of a comparison file
+
+    MessagePack files are read as a stream and every top-level value
+    but the metadata is skipped without being decoded; other formats
+    are decoded in full.
+    """
+    if msgpack is None:
+        return read_comparison(path).get("metadata", {})
+    with open(path, 'rb') as f:
+        head = f.read(4)
+        f.seek(0)
+        try:
+            if head.startswith(ZSTD_MAGIC):
+                if zstandard is None:
+                    return read_comparison(path).get("metadata", {})
+                # Peek at the first decompressed byte to learn the format
+                with zstandard.ZstdDecompressor().stream_reader(f, closefd=False) as reader:
+                    first = reader.read(1)
+                f.seek(0)
+                if detect_format(first) != "msgpack":
+                    return read_comparison(path).get("metadata", {})
+                with zstandard.ZstdDecompressor().stream_reader(f, closefd=False) as reader:
+                    return _unpack_metadata(reader)
+            if detect_format(head) != "msgpack":
+                return read_comparison(path).get("metadata", {})
+            return _unpack_metadata(f)
+        except ComparisonFormatError:
+            raise
+        except Exception as e:
+            raise ComparisonFormatError(f"Invalid comparison file: {e}")
+
+
+def _unpack_metadata(stream):
+    """Find the "metadata" value of a top-level MessagePack map"""
+    unpacker = msgpack.Unpacker(stream, raw=False, unicode_errors="surrogatepass", max_buffer_size=0)
+    for _ in range(unpacker.read_map_header()):
+        if unpacker.unpack() == "metadata":
+            return unpacker.unpack()
+        unpacker.skip()
+    return {}
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+import threading
+from bisect import bisect_left
+
+# Upper bounds of the request latency buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# Upper bounds of the response size buckets, in bytes
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class _Histogram:
+    """Bucket counts, sum and count per label values"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.series = {}  # label values -> [bucket counts (last is +Inf), sum, count]
+
+    def observe(self, labels, value):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+
+class DashboardMetrics:
+    """Request, response and file-load metrics of the dashboard, in Prometheus text format
+
+    Every update takes one short lock, so the counters stay exact under
+    threaded serving; the cost per request is a clock read, a bisect and
+    a few additions. Histograms are stored per bucket and only made
+    cumulative when rendered.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latency = _Histogram(LATENCY_BUCKETS)
+        self._sizes = _Histogram(SIZE_BUCKETS)
+        self._file_loads = {}  # (file, kind) -> [loads, bytes, seconds]
+        self._in_flight = 0
+
+    def request_started(self):
+        with self._lock:
+            self._in_flight += 1
+
+    def request_finished(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def observe_request(self, route, method, status, seconds, size):
+        """Record one response; size is None when not known up front (streamed)"""
+        with self._lock:
+            self._latency.observe((route, method, str(status)), seconds)
+            if size is not None:
+                self._sizes.observe((route,), size)
+
+    def observe_file_load(self, file_name, kind, size, seconds):
+        """Record one parse of a comparison file of size bytes"""
+        with self._lock:
+            totals = self._file_loads.get((file_name, kind))
+            if totals is None:
+                totals = self._file_loads[(file_name, kind)] = [0, 0, 0.0]
+            totals[0] += 1
+            totals[1] += size
+            totals[2] += seconds
+
+    def render(self, cache_stats=None):
+        """Return all metrics as Prometheus text; cache_stats is a ComparisonCache.stats() dict"""
+        with self._lock:
+            latency = {labels: (list(counts), total, count) for labels, (counts, total, count) in self._latency.series.items()}
+            sizes = {labels: (list(counts), total, count) for labels, (counts, total, count) in self._sizes.series.items()}
+            file_loads = {key: list(totals) for key, totals in self._file_loads.items()}
+            in_flight = self._in_flight
+
+        lines = []
+        _histogram(lines, "dashboard_request_duration_seconds", "Time to handle a request, by route",
+                   ("route", "method", "status"), LATENCY_BUCKETS, latency)
+        _histogram(lines, "dashboard_response_size_bytes", "Size of response bodies, by route",
+                   ("route",), SIZE_BUCKETS, sizes)
+        lines.append("# HELP dashboard_requests_in_flight Requests being handled")
+        lines.append("# TYPE dashboard_requests_in_flight gauge")
+        lines.append(f"dashboard_requests_in_flight {in_flight}")
+
+        for index, (name, help_text) in enumerate((
+                ("dashboard_file_loads_total", "Comparison files parsed"),
+                ("dashboard_file_load_bytes_total", "Bytes of comparison files parsed"),
+                ("dashboard_file_load_seconds_total", "Time spent parsing comparison files"))):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for (file_name, kind), totals in sorted(file_loads.items()):
+                lines.append(f"{name}{_labels(('file', 'kind'), (file_name, kind))} {_number(totals[index])}")
+
+        if cache_stats is not None:
+            for key, kind, help_text in (
+                    ("hits", "counter", "Parsed-comparison cache hits"),
+                    ("misses", "counter", "Parsed-comparison cache misses"),
+                    ("evictions", "counter", "Parsed-comparison cache evictions"),
+                    ("entries", "gauge", "Entries in the parsed-comparison cache"),
+                    ("bytes", "gauge", "Estimated memory of the parsed-comparison cache"),
+                    ("max_bytes", "gauge", "Memory budget of the parsed-comparison cache")):
+                name = f"dashboard_cache_{key}_total" if kind == "counter" else f"dashboard_cache_{key}"
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name} {_number(cache_stats[key])}")
+        return "\n".join(lines) + "\n"
+
+
+def _histogram(lines, name, help_text, label_names, buckets, series):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} histogram")
+    for labels, (counts, total, count) in sorted(series.items()):
+        cumulative = 0
+        for bound, bucket_count in zip(buckets + (float("inf"),), counts):
+            cumulative += bucket_count
+            le = "+Inf" if bound == float("inf") else _number(bound)
+            lines.append(f"{name}_bucket{_labels(label_names + ('le',), labels + (le,))} {cumulative}")
+        lines.append(f"{name}_sum{_labels(label_names, labels)} {_number(total)}")
+        lines.append(f"{name}_count{_labels(label_names, labels)} {count}")
+
+
+def _labels(names, values):
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in values)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
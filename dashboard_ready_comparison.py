@@ -1,11 +1,38 @@
 #!/usr/bin/env python3
 import sys
+import gzip
 import json
 import os
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from server import compare_api_structures
+from itertools import combinations
+from server import MAX_DEPTH, compare_api_structures
+from parse_cache import DEFAULT_PARSE_CACHE_DIR, DEFAULT_PARSE_CACHE_MB, load_endpoints
+from blob_store import BLOB_DIR_NAME, digest_bytes, encode_json, put_blob
+from sqlite_store import SQLITE_SUFFIX, write_comparison_sqlite
+from comparison_format import FILE_FORMATS, comparison_suffix, missing_dependency, write_comparison
+from index_log import INDEX_LOG_FILE, append_index_entry
+from ignore_rules import IgnoreRuleError, load_ignore_rules
+from stage_profile import DEFAULT_SLOWEST, StageProfiler
 import argparse
 
+# Brotli sidecars are optional
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Compact diff format: values above this many bytes are stored as a digest
+MAX_VALUE_BYTES = 1024
+# Compact diff format: cap on the encoded size of one endpoint's records
+MAX_DIFF_BYTES = 256 * 1024
+
+# Stages timed by --profile, in run order
+PROFILE_STAGES = ("load", "compare", "matrix", "process_for_dashboard", "write", "index")
+
+# Keys of a value_mismatch record that are not capture labels
+DIFF_RECORD_FIELDS = ("type", "change", "indices")
+
 def main():
     # Set up argument parser
     parser = argparse.ArgumentParser(description="Compare API structures and save dashboard-ready format")
@@ -13,14 +40,27 @@ def main():
                         help='JSON string array of file paths to compare')
     parser.add_argument('--output_dir', type=str, default="./dashboard_data",
                         help='Directory to save comparison results')
-    parser.add_argument('--comparison_level', type=str, default="comprehensive",
-                        choices=["basic", "detailed", "comprehensive"],
-                        help='Level of detail for comparison')
-    parser.add_argument('--metadata', type=str, default="{}",
-                        help='JSON string of metadata to include (e.g. version labels)')
+    parser.add_argument('--matrix', action='store_true',
+                        help='Compare every pair of files, one comparison per pair plus a summary grid')
+    parser.add_argument('--profile', action='store_true',
+                        help='Report wall time, CPU time and peak memory of each stage and the slowest endpoints')
+    parser.add_argument('--profile_slowest', type=int, default=DEFAULT_SLOWEST,
+                        help='Slowest endpoints listed by --profile')
+    parser.add_argument('--profile_memory', action='store_true',
+                        help='With --profile, also trace each stage\'s peak of Python allocations (much slower)')
+    parser.add_argument('--profile_stage', type=str, default=None, choices=PROFILE_STAGES,
+                        help='With --profile, run this stage under cProfile (the parent process only)')
+    parser.add_argument('--profile_output', type=str, default=None,
+                        help='File for the cProfile stats of --profile_stage (default: <stage>.prof)')
+    add_comparison_arguments(parser)
     
     # Parse arguments
     args = parser.parse_args()
+    check_comparison_arguments(parser, args)
+    if (args.profile_stage or args.profile_memory) and not args.profile:
+        parser.error("--profile_stage and --profile_memory need --profile")
+    profiler = StageProfiler(args.profile, args.profile_slowest, args.profile_memory, args.profile_stage,
+                             args.profile_output)
     
     # Parse file_paths from JSON string
     try:
@@ -43,61 +83,333 @@ def main():
     if not os.path.exists(args.output_dir):
         os.makedirs(args.output_dir)
     
+    # Captures are told apart by file name, or by their path when names repeat
+    instance_labels = capture_labels(file_paths)
+    if len(set(instance_labels)) < len(instance_labels):
+        print("Error: the same capture is given more than once")
+        sys.exit(1)
+    
     # Extract version labels from filenames or metadata
     file_labels = metadata.get("version_labels", [])
     if not file_labels or len(file_labels) != len(file_paths):
         # Extract labels from filenames if not provided
         file_labels = [os.path.basename(f).split('_')[0] for f in file_paths]
+        file_labels = [instance_label.replace(os.sep, "-") if file_labels.count(label) > 1 else label
+                       for label, instance_label in zip(file_labels, instance_labels)]
     
     print(f"Comparing files: {file_paths}")
     print(f"Using labels: {file_labels}")
     print(f"Output directory: {args.output_dir}")
     
-    # Load and parse the files
+    # Extract each capture's endpoints, streaming entries one at a time,
+    # unless the same content is already in the parse cache
     file_data = []
-    for file_path in file_paths:
-        try:
-            with open(file_path, 'r') as f:
-                data = json.load(f)
-                file_data.append({
-                    "data": data,
-                    "file_label": os.path.basename(file_path)
-                })
-        except (FileNotFoundError, json.JSONDecodeError) as e:
-            print(f"Error reading file {file_path}: {str(e)}")
+    with profiler.stage("load"):
+        for file_path, instance_label in zip(file_paths, instance_labels):
+            if not os.path.isfile(file_path):
+                print(f"Error reading file {file_path}: file not found")
+                sys.exit(1)
+            try:
+                endpoints, cached = load_endpoints(file_path, args.parse_cache_dir, args.parse_cache_mb * 1024 * 1024,
+                                                   profiler.entry_timings)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"Error reading file: {str(e)}")
+                sys.exit(1)
+            if cached:
+                print(f"Loaded endpoints of {file_path} from the parse cache")
+            file_data.append({
+                "endpoints": endpoints,
+                "file_label": instance_label
+            })
+    
+    if args.matrix:
+        if len(file_data) < 2:
+            print("Error: --matrix needs at least two files")
             sys.exit(1)
+        with profiler.stage("matrix"):
+            matrix_file, matrix = run_matrix(file_data, file_labels, metadata, args)
+        print(format_matrix(matrix))
+        if profiler.enabled:
+            print(profiler.format(), file=sys.stderr)
+        print(json.dumps({
+            "status": "success",
+            "message": f"Successfully saved {len(matrix['pairs'])} pair comparisons and the summary grid to {matrix_file}",
+            "matrix_file": matrix_file,
+            "output_files": [os.path.join(args.output_dir, pair["file"]) for pair in matrix["pairs"]],
+            "index_file": os.path.join(args.output_dir, INDEX_LOG_FILE)
+        }, indent=2))
+        return
     
     # Run the comparison
-    result = compare_api_structures(
-        file_paths=file_data,
-        output_dir=args.output_dir,
-        comparison_level=args.comparison_level
-    )
+    try:
+        with profiler.stage("compare"):
+            result = compare_api_structures(
+                file_paths=file_data,
+                output_dir=args.output_dir,
+                comparison_level=args.comparison_level,
+                workers=args.workers,
+                options=comparison_options(args),
+                endpoint_times=profiler.endpoint_times
+            )
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Error reading file: {str(e)}")
+        sys.exit(1)
+    
+    output_file = publish_comparison(result, file_labels, metadata, args.output_dir, args, profiler)
+    if profiler.enabled:
+        print(profiler.format(), file=sys.stderr)
+    
+    print(json.dumps({
+        "status": "success",
+        "message": f"Successfully saved dashboard-ready comparison to {output_file}",
+        "output_file": output_file,
+        "index_file": os.path.join(args.output_dir, INDEX_LOG_FILE)
+    }, indent=2))
+
+def add_comparison_arguments(parser):
+    """Add the comparison and output options shared with watch_captures.py"""
+    parser.add_argument('--comparison_level', type=str, default="comprehensive",
+                        choices=["basic", "detailed", "comprehensive"],
+                        help='Level of detail for comparison')
+    parser.add_argument('--metadata', type=str, default="{}",
+                        help='JSON string of metadata to include (e.g. version labels)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Worker processes for endpoint comparison (0 = one per CPU)')
+    parser.add_argument('--array_diff', type=str, default="aligned",
+                        choices=["aligned", "positional"],
+                        help='How to diff lists: align items and report only changes, or compare by index')
+    parser.add_argument('--array_key', type=str, default=None,
+                        help='Identity key used to match dict items in lists (e.g. id)')
+    parser.add_argument('--diff_format', type=str, default="nested",
+                        choices=["nested", "compact"],
+                        help='Store differences nested by field or as a flat list of compact records')
+    parser.add_argument('--max_value_bytes', type=int, default=MAX_VALUE_BYTES,
+                        help='Compact format: values larger than this are replaced by a digest and length')
+    parser.add_argument('--max_diff_bytes', type=int, default=MAX_DIFF_BYTES,
+                        help='Compact format: cap on the size of one endpoint\'s differences')
+    parser.add_argument('--output_format', type=str, default="json", choices=list(FILE_FORMATS) + ["sqlite"],
+                        help='Write the comparison as one JSON, MessagePack or CBOR file, or as an indexed SQLite database')
+    parser.add_argument('--compression', type=str, default="none", choices=["none", "zstd"],
+                        help='Compress JSON, MessagePack or CBOR output with zstd')
+    parser.add_argument('--precompress', type=str, nargs='+', default=[], choices=["gzip", "br"],
+                        help='Also write precompressed .gz and/or .br copies of the JSON output for the dashboard to serve')
+    parser.add_argument('--blob_store', action='store_true',
+                        help='Store values larger than --max_value_bytes once under <output_dir>/blobs and reference them by digest')
+    parser.add_argument('--parse_cache_dir', type=str, default=DEFAULT_PARSE_CACHE_DIR,
+                        help='Directory caching the endpoints extracted from each capture, keyed by content hash')
+    parser.add_argument('--parse_cache_mb', type=int, default=DEFAULT_PARSE_CACHE_MB,
+                        help='Size limit of the parse cache; least recently used captures are evicted (0 = no cache)')
+    parser.add_argument('--ignore_rules', type=str, default=None,
+                        help='JSON file of body pointers, key patterns and headers to leave out of the comparison')
+    parser.add_argument('--max_depth', type=int, default=MAX_DEPTH,
+                        help='Response body levels compared; deeper differences are marked truncated')
+    parser.add_argument('--max_nodes', type=int, default=0,
+                        help='Containers walked per response body before its comparison is truncated (0 = no limit)')
+    parser.add_argument('--time_limit', type=float, default=0,
+                        help='Seconds spent per response body before its comparison is truncated (0 = no limit)')
+
+def check_comparison_arguments(parser, args):
+    """Reject option combinations that cannot be written; exits through parser.error"""
+    if args.compression != "none" and args.output_format == "sqlite":
+        parser.error("--compression does not apply to --output_format sqlite")
+    if args.output_format != "sqlite":
+        missing = missing_dependency(args.output_format, None if args.compression == "none" else args.compression)
+        if missing:
+            parser.error(f"--output_format {args.output_format} --compression {args.compression} needs {missing} (pip install {missing})")
+    # Compiled once here and shared by every comparison of the run
+    args.ignore = None
+    if args.ignore_rules:
+        try:
+            args.ignore = load_ignore_rules(args.ignore_rules)
+        except IgnoreRuleError as e:
+            parser.error(str(e))
+
+def comparison_options(args):
+    """Return the body comparison options of compare_api_structures"""
+    return {
+        "array_diff": args.array_diff,
+        "array_key": args.array_key,
+        "ignore": args.ignore,
+        "max_depth": args.max_depth,
+        "max_nodes": args.max_nodes,
+        "time_limit": args.time_limit
+    }
+
+def publish_comparison(result, file_labels, metadata, output_dir, args, profiler=None):
+    """Write a comparison result to the dashboard directory and index it
+
+    args holds the options added by add_comparison_arguments. Returns the
+    path of the new comparison file. With an enabled StageProfiler, the
+    stages are timed and the report so far (up to the write) is stored
+    in the comparison's metadata under "profile".
+    """
+    profiler = profiler or StageProfiler()
     
     # Process the result into dashboard-friendly format
-    dashboard_data = process_for_dashboard(result, file_labels, metadata)
+    with profiler.stage("process_for_dashboard"):
+        dashboard_data = process_for_dashboard(
+            result, file_labels, metadata,
+            diff_format=args.diff_format,
+            max_value_bytes=args.max_value_bytes,
+            max_diff_bytes=args.max_diff_bytes,
+            blob_dir=os.path.join(output_dir, BLOB_DIR_NAME) if args.blob_store else None
+        )
+    if profiler.enabled:
+        dashboard_data["metadata"]["profile"] = profiler.report()
     
     # Create a unique filename based on timestamp and file labels
+    compression = None if args.compression == "none" else args.compression
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     labels_part = "-".join(file_labels)
-    output_file = os.path.join(args.output_dir, f"api_comparison_{labels_part}_{timestamp}.json")
+    suffix = SQLITE_SUFFIX if args.output_format == "sqlite" else comparison_suffix(args.output_format, compression)
+    output_file = reserve_output_file(output_dir, f"api_comparison_{labels_part}_{timestamp}", suffix)
     
     # Save the dashboard-ready data
-    with open(output_file, 'w') as f:
-        json.dump(dashboard_data, f, indent=2)
+    with profiler.stage("write"):
+        try:
+            if args.output_format == "sqlite":
+                write_comparison_sqlite(output_file, dashboard_data)
+            else:
+                write_comparison(output_file, dashboard_data, args.output_format, compression)
+        except BaseException:
+            # Do not leave the reserved empty file behind
+            os.remove(output_file)
+            raise
+        if args.output_format == "json" and not compression:
+            write_precompressed(output_file, args.precompress)
+        elif args.precompress:
+            print("Warning: --precompress only applies to uncompressed JSON output, skipping")
     
     # Generate an index file of all comparisons
-    update_index_file(args.output_dir, output_file, file_labels, metadata)
+    with profiler.stage("index"):
+        update_index_file(output_dir, output_file, file_labels, metadata)
+    return output_file
+
+def capture_labels(file_paths):
+    """Label each capture by its file name, or by its path below the captures' common
+    directory when several share a name (e.g. "prod/export.json", "staging/export.json")
+    """
+    names = [os.path.basename(file_path) for file_path in file_paths]
+    if len(set(names)) == len(names):
+        return names
+    paths = [os.path.abspath(file_path) for file_path in file_paths]
+    common = os.path.commonpath([os.path.dirname(path) for path in paths])
+    return [os.path.relpath(path, common) if names.count(name) > 1 else name for path, name in zip(paths, names)]
+
+def reserve_output_file(output_dir, stem, suffix):
+    """Create an empty output file named stem + suffix and return its path
+
+    Comparisons published within the same second, possibly by parallel
+    processes, get a counter; the file is created exclusively, so no
+    two writers get the same name.
+    """
+    counter = 0
+    while True:
+        name = f"{stem}_{counter}{suffix}" if counter else f"{stem}{suffix}"
+        output_file = os.path.join(output_dir, name)
+        try:
+            os.close(os.open(output_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666))
+            return output_file
+        except FileExistsError:
+            counter += 1
+
+# Directory under the output dir holding matrix summary grids (kept out of
+# the top level so the dashboard does not list them as comparisons)
+MATRIX_DIR_NAME = "matrices"
+
+# Worker process state of run_matrix: (file_data, file_labels, metadata, args)
+_matrix_state = None
+
+def run_matrix(file_data, file_labels, metadata, args):
+    """Compare every pair of already extracted captures and write a summary grid
+
+    Each capture is parsed once by the caller. The pair comparisons are
+    spread over args.workers processes (0 = one per CPU); the workers get
+    the endpoint maps once through the pool initializer, and each one
+    publishes its pair's comparison itself. Returns (grid path, grid).
+    """
+    pairs = list(combinations(range(len(file_data)), 2))
+    workers = args.workers or os.cpu_count() or 1
+    state = (file_data, file_labels, metadata, args)
+    if workers <= 1 or len(pairs) < 2:
+        _init_matrix_worker(*state)
+        results = [_compare_matrix_pair(pair) for pair in pairs]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(pairs)), initializer=_init_matrix_worker,
+                                 initargs=state) as executor:
+            results = list(executor.map(_compare_matrix_pair, pairs))
     
-    print(json.dumps({
-        "status": "success",
-        "message": f"Successfully saved dashboard-ready comparison to {output_file}",
-        "output_file": output_file,
-        "index_file": os.path.join(args.output_dir, "index.json")
-    }, indent=2))
+    count = len(file_data)
+    grid = [[None] * count for _ in range(count)]
+    for pair in results:
+        grid[pair["a"]][pair["b"]] = grid[pair["b"]][pair["a"]] = pair["endpoints_with_changes"]
+    matrix = {
+        "matrix_time": datetime.now().isoformat(),
+        "file_labels": file_labels,
+        "files": [f["file_label"] for f in file_data],
+        "custom_metadata": metadata,
+        "changes": grid,
+        "pairs": results
+    }
+    
+    matrix_dir = os.path.join(args.output_dir, MATRIX_DIR_NAME)
+    os.makedirs(matrix_dir, exist_ok=True)
+    matrix_file = reserve_output_file(matrix_dir, f"matrix_{datetime.now().strftime('%Y%m%d_%H%M%S')}", ".json")
+    with open(matrix_file, 'w') as f:
+        json.dump(matrix, f, indent=2)
+    return matrix_file, matrix
+
+def _init_matrix_worker(file_data, file_labels, metadata, args):
+    global _matrix_state
+    _matrix_state = (file_data, file_labels, metadata, args)
+
+def _compare_matrix_pair(pair):
+    """Compare and publish one pair of the matrix; returns its summary row"""
+    file_data, file_labels, metadata, args = _matrix_state
+    a, b = pair
+    result = compare_api_structures(
+        file_paths=[file_data[a], file_data[b]],
+        output_dir=args.output_dir,
+        comparison_level=args.comparison_level,
+        workers=1,
+        options=comparison_options(args)
+    )
+    output_file = publish_comparison(result, [file_labels[a], file_labels[b]], metadata, args.output_dir, args)
+    
+    added = removed = 0
+    for endpoint in result["detailed_results"].values():
+        if endpoint["present_in"] == [file_data[a]["file_label"]]:
+            removed += 1
+        elif endpoint["present_in"] == [file_data[b]["file_label"]]:
+            added += 1
+    return {
+        "a": a,
+        "b": b,
+        "file": os.path.basename(output_file),
+        "total_endpoints": result["summary"]["total_endpoints"],
+        "endpoints_with_changes": result["summary"]["endpoints_with_changes"],
+        "added": added,
+        "removed": removed
+    }
+
+def format_matrix(matrix):
+    """Render the change-count grid as a text table"""
+    labels = [f"{i}:{label}" for i, label in enumerate(matrix["file_labels"])]
+    width = max(len(label) for label in labels) + 2
+    lines = [" " * width + "".join(str(i).rjust(8) for i in range(len(labels)))]
+    for label, row in zip(labels, matrix["changes"]):
+        lines.append(label.ljust(width) + "".join(("-" if count is None else str(count)).rjust(8) for count in row))
+    return "\n".join(lines)
+
+def process_for_dashboard(comparison_result, file_labels, metadata, diff_format="nested",
+                          max_value_bytes=MAX_VALUE_BYTES, max_diff_bytes=MAX_DIFF_BYTES, blob_dir=None):
+    """Convert the comparison result into a dashboard-friendly format
 
-def process_for_dashboard(comparison_result, file_labels, metadata):
-    """Convert the comparison result into a dashboard-friendly format"""
+    With diff_format="compact" each endpoint's differences are stored as
+    flat records (see compact_differences) instead of the nested form.
+    With a blob_dir, values larger than max_value_bytes are moved into the
+    blob store in either format and referenced by digest.
+    """
     # Initialize the dashboard data structure
     dashboard_data = {
         "metadata": {
@@ -105,7 +417,9 @@ def process_for_dashboard(comparison_result, file_labels, metadata):
             "file_labels": file_labels,
             "custom_metadata": metadata,
             "total_endpoints": comparison_result.get("summary", {}).get("total_endpoints", 0),
-            "endpoints_with_changes": comparison_result.get("summary", {}).get("endpoints_with_changes", 0)
+            "endpoints_with_changes": comparison_result.get("summary", {}).get("endpoints_with_changes", 0),
+            "diff_format": diff_format,
+            "blob_store": BLOB_DIR_NAME if blob_dir else None
         },
         "endpoints": {},
         "summary": {
@@ -121,6 +435,12 @@ def process_for_dashboard(comparison_result, file_labels, metadata):
     # Process detailed results
     detailed_results = comparison_result.get("detailed_results", {})
     for endpoint_key, endpoint_data in detailed_results.items():
+        differences = endpoint_data.get("differences", {})
+        if diff_format == "compact" and differences:
+            differences = compact_differences(differences, max_value_bytes, max_diff_bytes, blob_dir)
+        elif blob_dir and differences:
+            differences = externalize_values(differences, max_value_bytes, blob_dir)
+        
         # Create endpoint entry
         endpoint_summary = {
             "method": endpoint_data.get("method", ""),
@@ -129,7 +449,7 @@ def process_for_dashboard(comparison_result, file_labels, metadata):
             "status": "changed" if endpoint_data.get("has_changes") else "unchanged",
             "present_in": endpoint_data.get("present_in", []),
             "missing_in": endpoint_data.get("missing_in", []),
-            "differences": endpoint_data.get("differences", {})
+            "differences": differences
         }
         
         # Add to endpoints collection
@@ -163,36 +483,127 @@ def process_for_dashboard(comparison_result, file_labels, metadata):
     
     return dashboard_data
 
-def update_index_file(output_dir, new_file, file_labels, metadata):
-    """Update or create an index file listing all comparisons"""
-    index_file = os.path.join(output_dir, "index.json")
+def compact_differences(differences, max_value_bytes=MAX_VALUE_BYTES, max_diff_bytes=MAX_DIFF_BYTES,
+                        blob_dir=None):
+    """Flatten nested differences into size-bounded {pointer, kind, values} records
+
+    pointer is a JSON pointer into the differences ("/response/items/3/id"),
+    kind is "changed", "added" or "removed". List items are addressed by
+    their index in the first list; an added list item, which that list
+    lacks, by its index in the list of the label given as "side" (the
+    nested form keys it "+<label>:<index>"). Values whose JSON encoding is
+    longer than max_value_bytes are replaced by {"$digest", "$length"}
+    (and stored in blob_dir when given).
+    Records are kept while their compact JSON encoding fits in
+    max_diff_bytes; the first one that does not fit and all after it are
+    dropped and the result is marked truncated.
+    """
+    records = []
+    size = 0
+    total = 0
+    full = False
+    for pointer, record in iter_difference_records(differences):
+        total += 1
+        if full:
+            continue
+        
+        compact = {
+            "pointer": pointer,
+            "kind": record.get("change", "changed"),
+            "values": {}
+        }
+        if compact["kind"] == "added" and "indices" in record:
+            side, index = next((label, i) for label, i in record["indices"].items() if i is not None)
+            compact["pointer"] = f"{pointer.rsplit('/', 1)[0]}/{index}"
+            compact["side"] = side
+        for label, value in record.items():
+            if label in DIFF_RECORD_FIELDS:
+                continue
+            compact["values"][label] = compact_value(value, max_value_bytes, blob_dir)[0]
+        if "indices" in record:
+            compact["indices"] = record["indices"]
+        # One more byte for the comma separating records
+        record_size = len(encode_json(compact)) + 1
+        if size + record_size > max_diff_bytes:
+            full = True
+            continue
+        size += record_size
+        records.append(compact)
     
-    # Initialize or load the index
-    if os.path.exists(index_file):
-        with open(index_file, 'r') as f:
-            try:
-                index_data = json.load(f)
-            except json.JSONDecodeError:
-                index_data = {"comparisons": []}
-    else:
-        index_data = {"comparisons": []}
+    return {
+        "format": "compact",
+        "records": records,
+        "total_records": total,
+        "truncated": len(records) < total
+    }
+
+def iter_difference_records(node, pointer=""):
+    """Yield (json_pointer, value_mismatch record) pairs from nested differences"""
+    if not isinstance(node, dict):
+        return
+    if node.get("type") == "value_mismatch":
+        yield pointer, node
+        return
+    for key, child in node.items():
+        segment = str(key).replace("~", "~0").replace("/", "~1")
+        yield from iter_difference_records(child, f"{pointer}/{segment}")
+
+def externalize_values(differences, max_value_bytes=MAX_VALUE_BYTES, blob_dir=None):
+    """Copy nested differences with large mismatched values replaced by blob references"""
+    if not isinstance(differences, dict):
+        return differences
+    if differences.get("type") != "value_mismatch":
+        return {key: externalize_values(child, max_value_bytes, blob_dir)
+                for key, child in differences.items()}
+    return {
+        key: value if key in DIFF_RECORD_FIELDS else compact_value(value, max_value_bytes, blob_dir)[0]
+        for key, value in differences.items()
+    }
+
+def compact_value(value, max_value_bytes=MAX_VALUE_BYTES, blob_dir=None):
+    """Return (stored value, encoded size); large values become a digest and length
+
+    When blob_dir is given the full value is written to the blob store, so
+    the digest can be resolved later through /api/blob/<digest>.
+    """
+    encoded = encode_json(value)
+    if len(encoded) <= max_value_bytes:
+        return value, len(encoded)
+    digest = digest_bytes(encoded)
+    if blob_dir:
+        put_blob(blob_dir, encoded, digest)
+    placeholder = {"$digest": digest, "$length": len(encoded)}
+    return placeholder, len(json.dumps(placeholder))
+
+def write_precompressed(file_path, encodings):
+    """Write compressed sidecars (file.gz, file.br) next to a comparison file
+
+    The dashboard sends these as-is to clients that accept the encoding,
+    so they are compressed once at the highest level.
+    """
+    if not encodings:
+        return
+    with open(file_path, 'rb') as f:
+        data = f.read()
     
-    # Add the new comparison to the index
-    new_entry = {
+    if "gzip" in encodings:
+        with open(file_path + ".gz", 'wb') as f:
+            f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    if "br" in encodings:
+        if brotli is None:
+            print("Warning: brotli is not installed, skipping the .br copy")
+        else:
+            with open(file_path + ".br", 'wb') as f:
+                f.write(brotli.compress(data, quality=11))
+
+def update_index_file(output_dir, new_file, file_labels, metadata):
+    """Add a comparison to the index of the output directory"""
+    append_index_entry(output_dir, {
         "file": os.path.basename(new_file),
         "timestamp": datetime.now().isoformat(),
         "file_labels": file_labels,
         "metadata": metadata
-    }
-    
-    index_data["comparisons"].append(new_entry)
-    
-    # Sort by timestamp (newest first)
-    index_data["comparisons"].sort(key=lambda x: x["timestamp"], reverse=True)
-    
-    # Write the updated index
-    with open(index_file, 'w') as f:
-        json.dump(index_data, f, indent=2)
+    })
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
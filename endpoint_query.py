@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+import base64
+import binascii
+import bisect
+import json
+import re
+
+from sqlite_store import endpoint_change_types
+
+# Endpoint fields that can be selected with ?fields=
+ENDPOINT_FIELDS = ("method", "host", "path", "status", "present_in", "missing_in", "differences")
+
+# Filters answered from the per-field sets of an endpoint index
+INDEXED_FILTERS = ("host", "method", "status", "change_type")
+
+
+class QueryError(ValueError):
+    """An /api/endpoints query parameter is invalid"""
+
+
+def parse_endpoint_query(args):
+    """Validate /api/endpoints query parameters into a query dict
+
+    Raises QueryError for an unknown field, a bad regex, limit or cursor.
+    """
+    query = {name: args.get(name) or None for name in INDEXED_FILTERS}
+    query["path_prefix"] = args.get("path_prefix") or None
+
+    path_regex = args.get("path_regex")
+    try:
+        query["path_regex"] = re.compile(path_regex) if path_regex else None
+    except re.error as e:
+        raise QueryError(f"Invalid path_regex: {e}")
+
+    fields = args.get("fields")
+    if fields:
+        query["fields"] = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown = [field for field in query["fields"] if field not in ENDPOINT_FIELDS]
+        if unknown:
+            raise QueryError(f"Unknown fields: {', '.join(unknown)}")
+    else:
+        query["fields"] = None
+
+    limit = args.get("limit")
+    if limit is not None:
+        try:
+            query["limit"] = int(limit)
+        except ValueError:
+            raise QueryError("limit must be an integer")
+        if query["limit"] < 1:
+            raise QueryError("limit must be positive")
+    else:
+        query["limit"] = None
+
+    cursor = args.get("cursor")
+    query["after"] = decode_cursor(cursor) if cursor else None
+    return query
+
+
+def encode_cursor(key):
+    """Return an opaque cursor that resumes after an endpoint key"""
+    return base64.urlsafe_b64encode(json.dumps({"after": key}).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor):
+    """Return the endpoint key a cursor resumes after"""
+    try:
+        after = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))["after"]
+    except (binascii.Error, UnicodeError, ValueError, KeyError, TypeError):
+        raise QueryError("Invalid cursor")
+    # Keys are strings; anything else would fail when compared with them
+    if not isinstance(after, str):
+        raise QueryError("Invalid cursor")
+    return after
+
+
+def build_endpoint_index(comparison_data):
+    """Index a comparison's endpoints for repeated queries
+
+    Endpoints are ordered by key, which is the stable order used for
+    pagination, and every indexed filter maps its values to sets of keys.
+    The parsed comparison and its metadata are kept alongside.
+    """
+    endpoints = comparison_data.get("endpoints", {})
+    change_types = endpoint_change_types(comparison_data)
+    by_field = {name: {} for name in INDEXED_FILTERS}
+    for key, endpoint in endpoints.items():
+        values = {
+            "host": endpoint.get("host"),
+            "method": endpoint.get("method"),
+            "status": endpoint.get("status"),
+            "change_type": change_types[key]
+        }
+        for name, value in values.items():
+            by_field[name].setdefault(value, set()).add(key)
+    return {
+        "comparison": comparison_data,
+        "metadata": comparison_data.get("metadata", {}),
+        "endpoints": endpoints,
+        "keys": sorted(endpoints),
+        "by_field": by_field
+    }
+
+
+def query_endpoint_index(index, query):
+    """Run a parsed query against an endpoint index
+
+    Returns (endpoints, next_key): the matching endpoints in key order,
+    projected to the requested fields, and the key to resume after when
+    the limit cut the results short (None otherwise).
+    """
+    # Intersect the sets of the equality filters, smallest first
+    candidates = None
+    sets = [index["by_field"][name].get(query[name], set()) for name in INDEXED_FILTERS if query[name] is not None]
+    for keys in sorted(sets, key=len):
+        candidates = set(keys) if candidates is None else candidates & keys
+        if not candidates:
+            break
+
+    if candidates is None:
+        keys = index["keys"]
+        start = bisect.bisect_right(keys, query["after"]) if query["after"] is not None else 0
+        ordered = (keys[i] for i in range(start, len(keys)))
+    else:
+        ordered = sorted(key for key in candidates if query["after"] is None or key > query["after"])
+
+    return _collect(ordered, index["endpoints"], query)
+
+
+def _collect(ordered_keys, endpoints, query):
+    """Apply the path filters, projection and limit to keys in order"""
+    path_prefix = query["path_prefix"]
+    path_regex = query["path_regex"]
+    limit = query["limit"]
+    results = {}
+    for key in ordered_keys:
+        endpoint = endpoints[key]
+        path = endpoint.get("path", "")
+        if path_prefix and not path.startswith(path_prefix):
+            continue
+        if path_regex and not path_regex.search(path):
+            continue
+        if limit is not None and len(results) == limit:
+            return results, last_key
+        results[key] = project_endpoint(endpoint, query["fields"])
+        last_key = key
+    return results, None
+
+
+def project_endpoint(endpoint, fields):
+    """Keep only the requested fields of an endpoint (all when fields is None)"""
+    if fields is None:
+        return endpoint
+    return {field: endpoint[field] for field in fields if field in endpoint}
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+import json
+import re
+
+# Keys a rule file may contain
+RULE_FIELDS = ("pointers", "key_patterns", "headers", "header_patterns")
+
+# Returned by IgnoreRules.step for an ignored subtree
+IGNORED = "ignored"
+
+
+class IgnoreRuleError(ValueError):
+    """An ignore rule file or rule is invalid"""
+
+
+class IgnoreRules:
+    """Compiled rules for fields and headers the comparison skips
+
+    pointers are JSON pointers into response bodies where a segment may
+    be "*" (any one key or index) or "**" (any number of segments), e.g.
+    "/meta/generated_at", "/items/*/etag" or "/**/request_id". They are
+    compiled into a trie that the comparator walks alongside the bodies:
+    step() maps the current trie state and a key to the next state, and
+    states are memoized, so each distinct (state, key) is resolved once.
+    key_patterns are regexes matched against key names at any depth.
+    headers are header names and header_patterns regexes, both case
+    insensitive.
+    """
+
+    def __init__(self, pointers=(), key_patterns=(), headers=(), header_patterns=()):
+        # Trie nodes: literal children, "*" child, "**" child, loops on any segment, ends a rule
+        self._nodes = []
+        root = self._new_node()
+        for pointer in pointers:
+            self._add_pointer(root, pointer)
+
+        self._key_regex = _compile_any(key_patterns, 0)
+        self._headers = {header.lower() for header in headers}
+        self._header_regex = _compile_any(header_patterns, re.IGNORECASE)
+        self._transitions = {}
+        self._initial = self._state([root])
+
+    @property
+    def ignores_fields(self):
+        """Whether any rule applies to response bodies"""
+        return self._initial is not None
+
+    def initial(self):
+        """State at the root of a body: IGNORED, None (no rule can match) or a trie state"""
+        return self._initial
+
+    def step(self, state, segment):
+        """State below a dict key or list index of a node in state"""
+        if self._key_regex is not None and isinstance(segment, str) and self._key_regex.search(segment):
+            return IGNORED
+        nodes, has_literals = state
+        # Without literal children the next state does not depend on the segment
+        key = (state, str(segment) if has_literals else None)
+        try:
+            return self._transitions[key]
+        except KeyError:
+            pass
+        text = str(segment)
+        targets = []
+        for node in nodes:
+            literal, star, _, loop, _ = self._nodes[node]
+            if text in literal:
+                targets.append(literal[text])
+            if star is not None:
+                targets.append(star)
+            if loop:
+                targets.append(node)
+        next_state = self._state(targets)
+        self._transitions[key] = next_state
+        return next_state
+
+    def ignores_header(self, name):
+        lowered = name.lower()
+        return lowered in self._headers or (self._header_regex is not None and self._header_regex.search(name) is not None)
+
+    def _state(self, targets):
+        """Close a set of nodes over "**" and turn it into a hashable state"""
+        nodes = set()
+        pending = list(targets)
+        while pending:
+            node = pending.pop()
+            if node in nodes:
+                continue
+            nodes.add(node)
+            globstar = self._nodes[node][2]
+            if globstar is not None:
+                pending.append(globstar)
+        if any(self._nodes[node][4] for node in nodes):
+            return IGNORED
+        # Nodes with nothing below them can never lead to a match
+        nodes = frozenset(node for node in nodes if self._live(node))
+        if not nodes and self._key_regex is None:
+            return None
+        return (nodes, any(self._nodes[node][0] for node in nodes))
+
+    def _live(self, node):
+        literal, star, globstar, loop, _ = self._nodes[node]
+        return bool(literal) or star is not None or globstar is not None or loop
+
+    def _new_node(self, loop=False):
+        self._nodes.append([{}, None, None, loop, False])
+        return len(self._nodes) - 1
+
+    def _add_pointer(self, root, pointer):
+        if not isinstance(pointer, str) or (pointer and not pointer.startswith("/")):
+            raise IgnoreRuleError(f"Ignore pointer must start with '/': {pointer!r}")
+        node = root
+        segments = pointer.split("/")[1:] if pointer else []
+        for segment in segments:
+            segment = segment.replace("~1", "/").replace("~0", "~")
+            fields = self._nodes[node]
+            if segment == "**":
+                if fields[2] is None:
+                    fields[2] = self._new_node(loop=True)
+                node = fields[2]
+            elif segment == "*":
+                if fields[1] is None:
+                    fields[1] = self._new_node()
+                node = fields[1]
+            else:
+                if segment not in fields[0]:
+                    fields[0][segment] = self._new_node()
+                node = fields[0][segment]
+        self._nodes[node][4] = True
+
+
+def _compile_any(patterns, flags):
+    """Compile regexes into one alternation, or None when there are none"""
+    if not patterns:
+        return None
+    try:
+        for pattern in patterns:
+            re.compile(pattern)
+        return re.compile("|".join(f"(?:{pattern})" for pattern in patterns), flags)
+    except (re.error, TypeError) as e:
+        raise IgnoreRuleError(f"Invalid ignore pattern: {e}")
+
+
+def load_ignore_rules(path):
+    """Read and compile a JSON rule file
+
+    {"pointers": ["/meta/generated_at", "/**/request_id"],
+     "key_patterns": ["_at$"],
+     "headers": ["Date", "X-Request-Id"],
+     "header_patterns": ["^x-amz-"]}
+
+    Raises IgnoreRuleError for an unreadable file or an invalid rule.
+    """
+    try:
+        with open(path, 'r') as f:
+            rules = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        raise IgnoreRuleError(f"Cannot read ignore rules {path}: {e}")
+    if not isinstance(rules, dict):
+        raise IgnoreRuleError("Ignore rules must be a JSON object")
+    unknown = [key for key in rules if key not in RULE_FIELDS]
+    if unknown:
+        raise IgnoreRuleError(f"Unknown ignore rule fields: {', '.join(unknown)}")
+    for field in RULE_FIELDS:
+        if not isinstance(rules.get(field, []), list):
+            raise IgnoreRuleError(f"Ignore rule field {field} must be a list")
+    return IgnoreRules(**{field: rules.get(field, []) for field in RULE_FIELDS})
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+from contextlib import contextmanager
+from atomic_files import atomic_open
+
+# Locking is fcntl on POSIX and msvcrt on Windows
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+# Compacted snapshot, in the original {"comparisons": [...]} format
+INDEX_FILE = "index.json"
+# One JSON entry per line, appended since the last compaction
+INDEX_LOG_FILE = "index.jsonl"
+# Held while appending, compacting or reading
+INDEX_LOCK_FILE = ".index.lock"
+
+# The log is compacted into the snapshot once it is larger than this
+INDEX_LOG_MAX_BYTES = 256 * 1024
+
+
+@contextmanager
+def _locked(data_dir, exclusive=True):
+    """Hold the index lock of a data directory
+
+    The lock lives in its own file, so it stays valid while index.json
+    is replaced and the log is truncated.
+    """
+    with open(os.path.join(data_dir, INDEX_LOCK_FILE), 'a+b') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        else:
+            # msvcrt locks are always exclusive; LK_LOCK gives up after 10 tries
+            lock_file.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def append_index_entry(data_dir, entry):
+    """Append one comparison entry to the index log
+
+    Costs one locked append however long the history is, and parallel
+    writers never lose each other's entries. The log is folded into
+    index.json only once it has grown past INDEX_LOG_MAX_BYTES.
+    """
+    line = (json.dumps(entry) + "\n").encode("utf-8")
+    with _locked(data_dir):
+        with open(os.path.join(data_dir, INDEX_LOG_FILE), 'a+b') as f:
+            # Start on a fresh line if a killed writer left a partial one
+            if f.seek(0, os.SEEK_END) > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    line = b"\n" + line
+            f.write(line)
+            f.flush()
+            log_size = os.fstat(f.fileno()).st_size
+        if log_size > INDEX_LOG_MAX_BYTES:
+            _compact(data_dir)
+
+
+def read_index(data_dir):
+    """Return all index entries, newest first, merging the snapshot and the log
+
+    Entries are keyed by file name; a later entry for the same file
+    replaces the earlier one. This is the only complete view: index.json
+    alone lags behind by whatever the log holds until the next compaction.
+    """
+    with _locked(data_dir, exclusive=False):
+        return _merge(data_dir)
+
+
+def compact_index(data_dir):
+    """Fold the log into index.json and empty the log"""
+    with _locked(data_dir):
+        return _compact(data_dir)
+
+
+def _compact(data_dir):
+    """Compact while holding the lock; returns the merged entries
+
+    index.json is replaced before the log is truncated, so a crash in
+    between leaves entries in both places, which the merge tolerates.
+    """
+    comparisons = _merge(data_dir)
+    with atomic_open(os.path.join(data_dir, INDEX_FILE), 'w') as f:
+        json.dump({"comparisons": comparisons}, f, indent=2)
+    open(os.path.join(data_dir, INDEX_LOG_FILE), 'w').close()
+    return comparisons
+
+
+def _merge(data_dir):
+    """Read the snapshot and the log into one list, newest first"""
+    entries = {}
+    try:
+        with open(os.path.join(data_dir, INDEX_FILE), 'r') as f:
+            snapshot = json.load(f)
+        for entry in snapshot.get("comparisons", []):
+            if isinstance(entry, dict):
+                entries[entry.get("file")] = entry
+    except (FileNotFoundError, json.JSONDecodeError, AttributeError, TypeError):
+        pass
+
+    try:
+        with open(os.path.join(data_dir, INDEX_LOG_FILE), 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A writer killed mid-line leaves a partial entry
+                    continue
+                # A damaged line can also parse as something other than an entry (e.g. null)
+                if isinstance(entry, dict):
+                    entries[entry.get("file")] = entry
+    except FileNotFoundError:
+        pass
+
+    comparisons = list(entries.values())
+    comparisons.sort(key=lambda x: x.get("timestamp", ""), reverse=True)
+    return comparisons
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print or compact the comparison index of a dashboard data directory")
+    parser.add_argument('--output_dir', type=str, default="./dashboard_data",
+                        help='Directory where dashboard files are stored')
+    parser.add_argument('--compact', action='store_true',
+                        help='Fold index.jsonl into index.json now')
+    args = parser.parse_args()
+
+    if args.compact:
+        comparisons = compact_index(args.output_dir)
+    else:
+        comparisons = read_index(args.output_dir)
+    print(json.dumps({"comparisons": comparisons}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
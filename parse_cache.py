@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+import hashlib
+import os
+import pickle
+import tempfile
+
+from server import EXTRACTOR_VERSION, extract_endpoints
+from capture_stream import iter_capture_entries
+from atomic_files import atomic_open, private_dir
+
+# Shared by all runs of the current user unless --parse_cache_dir is given
+DEFAULT_PARSE_CACHE_DIR = os.path.join(tempfile.gettempdir(), "api_dashboard_parse_cache")
+
+# Total size of the cached endpoint maps before the least recently used are removed
+DEFAULT_PARSE_CACHE_MB = 1024
+
+# Bytes read at a time while hashing a capture
+HASH_CHUNK_SIZE = 1 << 20
+
+CACHE_SUFFIX = ".pickle"
+
+
+def load_endpoints(file_path, cache_dir=DEFAULT_PARSE_CACHE_DIR, max_bytes=DEFAULT_PARSE_CACHE_MB * 1024 * 1024,
+                   timings=None):
+    """Return (endpoints, cached) for a capture, using the parse cache when possible
+
+    Entries are keyed by the SHA-256 of the capture's content and
+    EXTRACTOR_VERSION, so a renamed or copied capture still hits and a
+    changed extractor never reads stale maps. Hashing a capture costs a
+    fraction of parsing it. With no cache_dir or max_bytes <= 0 the
+    capture is always parsed. timings is passed on to extract_endpoints.
+    """
+    if not cache_dir or max_bytes <= 0 or not _usable_cache_dir(cache_dir):
+        return _parse(file_path, timings), False
+
+    entry_path = os.path.join(cache_dir, f"{file_digest(file_path)}-v{EXTRACTOR_VERSION}{CACHE_SUFFIX}")
+    try:
+        with open(entry_path, 'rb') as f:
+            endpoints = pickle.load(f)
+        # The mtime of an entry records when it was last used, for eviction
+        os.utime(entry_path)
+        return endpoints, True
+    except FileNotFoundError:
+        pass
+    except Exception:
+        # A truncated or incompatible entry is rebuilt
+        _remove(entry_path)
+
+    endpoints = _parse(file_path, timings)
+    store_endpoints(cache_dir, entry_path, endpoints, max_bytes)
+    return endpoints, False
+
+
+def file_digest(file_path):
+    """Return the hex SHA-256 of a file's content"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def store_endpoints(cache_dir, entry_path, endpoints, max_bytes):
+    """Write a cache entry atomically, then evict entries over max_bytes"""
+    try:
+        with atomic_open(entry_path) as f:
+            pickle.dump(endpoints, f, protocol=pickle.HIGHEST_PROTOCOL)
+            if f.tell() > max_bytes:
+                # Larger than the whole cache; keep the cache as it is
+                raise _EntryTooLarge()
+    except _EntryTooLarge:
+        return
+    except OSError as e:
+        print(f"Warning: could not write parse cache entry {entry_path}: {e}")
+        return
+    evict(cache_dir, max_bytes)
+
+
+def evict(cache_dir, max_bytes):
+    """Remove the least recently used entries until the cache fits in max_bytes"""
+    entries = []
+    total = 0
+    with os.scandir(cache_dir) as it:
+        for dir_entry in it:
+            if not dir_entry.name.endswith(CACHE_SUFFIX):
+                continue
+            try:
+                stat = dir_entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, dir_entry.path))
+            total += stat.st_size
+
+    entries.sort()
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        _remove(path)
+        total -= size
+
+
+def _parse(file_path, timings=None):
+    return extract_endpoints({"entries": iter_capture_entries(file_path)}, timings)
+
+
+def _usable_cache_dir(cache_dir):
+    """Create the cache directory, and refuse one other users could write to
+
+    Entries are unpickled, so on POSIX the directory must belong to the
+    current user and not be writable by anyone else.
+    """
+    try:
+        private = private_dir(cache_dir)
+    except OSError as e:
+        print(f"Warning: parse cache disabled, cannot use {cache_dir}: {e}")
+        return False
+    if not private:
+        print(f"Warning: parse cache disabled, {cache_dir} is not private to the current user")
+    return private
+
+
+class _EntryTooLarge(Exception):
+    """A cache entry is larger than the whole cache"""
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
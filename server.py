@@ -1,11 +1,48 @@
 #!/usr/bin/env python3
+import difflib
 import json
+import marshal
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from itertools import repeat
 from urllib.parse import urlparse
+from ignore_rules import IGNORED
 
-def compare_api_structures(file_paths, output_dir="./dashboard_data", comparison_level="comprehensive"):
-    """Compare API structures from multiple files"""
+# Batches handed to each worker process, per worker, when comparing in parallel
+BATCHES_PER_WORKER = 8
+
+# Format 2 has no back-references, so equal values serialize identically
+MARSHAL_VERSION = 2
+
+# Equal-length lists shorter than this are compared by index, not aligned
+ALIGN_MIN_LENGTH = 16
+
+# Response bodies nested deeper than this are not walked; keeps the written
+# differences within the nesting limits of the JSON and MessagePack encoders
+MAX_DEPTH = 256
+
+# Containers walked between checks of a comparison's time limit
+TIME_CHECK_INTERVAL = 256
+
+# Version of the endpoint maps built by extract_endpoints; bump it when
+# process_entry or ResponseBody change so cached maps are rebuilt
+EXTRACTOR_VERSION = 1
+
+def compare_api_structures(file_paths, output_dir="./dashboard_data", comparison_level="comprehensive", workers=1, options=None,
+                           endpoint_times=None):
+    """Compare API structures from multiple files
+
+    Each item of file_paths has a "file_label" and either the parsed capture
+    under "data", an iterable of capture entries under "entries", or the
+    endpoints already extracted by extract_endpoints under "endpoints".
+    With workers > 1 the endpoint comparisons are spread over a process pool
+    (0 means one worker per CPU); the result is the same as the serial run.
+    options tunes the body comparison (see compare_json_values_nway).
+    With an endpoint_times dict, the seconds spent comparing each endpoint
+    are stored in it by endpoint key.
+    """
     # Initialize results
     comparison_result = {
         "summary": {
@@ -19,20 +56,10 @@ def compare_api_structures(file_paths, output_dir="./dashboard_data", comparison
     # Process each file's data
     all_endpoints = {}
     for file_data in file_paths:
-        data = file_data["data"]
         file_label = file_data["file_label"]
         
-        # Extract endpoints from the data
-        endpoints = {}
-        if isinstance(data, list):
-            for entry in data:
-                process_entry(entry, endpoints)
-        elif isinstance(data, dict):
-            if "entries" in data:
-                for entry in data["entries"]:
-                    process_entry(entry, endpoints)
-            else:
-                process_entry(data, endpoints)
+        # Extract endpoints from the data, unless that was done already
+        endpoints = file_data["endpoints"] if "endpoints" in file_data else extract_endpoints(file_data)
         
         # Add to all_endpoints with file label
         for key, endpoint in endpoints.items():
@@ -52,17 +79,21 @@ def compare_api_structures(file_paths, output_dir="./dashboard_data", comparison
                 all_endpoints[key]["instances"][file_label] = endpoint
     
     # Compare endpoints
+    pending = []
     for key, endpoint in all_endpoints.items():
         # Calculate missing_in
         endpoint["missing_in"] = [f["file_label"] for f in file_paths if f["file_label"] not in endpoint["present_in"]]
         
         # Compare instances if present in multiple files
         if len(endpoint["present_in"]) > 1:
-            differences = compare_endpoint_instances(endpoint["instances"], comparison_level)
-            if differences:
-                endpoint["has_changes"] = True
-                endpoint["differences"] = differences
-                comparison_result["summary"]["endpoints_with_changes"] += 1
+            pending.append((key, endpoint["instances"]))
+    
+    for key, differences in compare_endpoints(pending, comparison_level, workers, options, endpoint_times):
+        if differences:
+            endpoint = all_endpoints[key]
+            endpoint["has_changes"] = True
+            endpoint["differences"] = differences
+            comparison_result["summary"]["endpoints_with_changes"] += 1
     
     # Update summary
     comparison_result["summary"]["total_endpoints"] = len(all_endpoints)
@@ -70,6 +101,97 @@ def compare_api_structures(file_paths, output_dir="./dashboard_data", comparison
     
     return comparison_result
 
+def extract_endpoints(file_data, timings=None):
+    """Return the endpoints of one capture, keyed by "METHOD:path"
+
+    file_data holds the parsed capture under "data" or an iterable of
+    capture entries under "entries". The result can be passed back to
+    compare_api_structures as "endpoints" to compare a capture again
+    without re-reading it. With a timings dict, the calls to
+    process_entry and the wall and CPU seconds spent in them are added
+    to timings["process_entry"].
+    """
+    process = process_entry if timings is None else _timed_process_entry(timings)
+    endpoints = {}
+    if "entries" in file_data:
+        # Streamed input: entries arrive one at a time from an iterator
+        for entry in file_data["entries"]:
+            process(entry, endpoints)
+    else:
+        data = file_data["data"]
+        if isinstance(data, list):
+            for entry in data:
+                process(entry, endpoints)
+        elif isinstance(data, dict):
+            if "entries" in data:
+                for entry in data["entries"]:
+                    process(entry, endpoints)
+            else:
+                process(data, endpoints)
+    return endpoints
+
+def _timed_process_entry(timings):
+    """Return process_entry wrapped to add its calls and wall and CPU seconds to timings"""
+    totals = timings.setdefault("process_entry", {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0})
+    
+    def process(entry, endpoints):
+        wall, cpu = time.perf_counter(), time.process_time()
+        process_entry(entry, endpoints)
+        totals["wall_s"] += time.perf_counter() - wall
+        totals["cpu_s"] += time.process_time() - cpu
+        totals["calls"] += 1
+    return process
+
+def compare_endpoints(pending, comparison_level, workers=1, options=None, endpoint_times=None):
+    """Yield (key, differences) for each (key, instances) pair, in input order
+
+    With an endpoint_times dict, each endpoint's comparison is timed where
+    it runs (in the worker process, with workers) and stored in it.
+    """
+    timed = endpoint_times is not None
+    if workers == 0:
+        workers = os.cpu_count() or 1
+    
+    if workers <= 1 or len(pending) < 2:
+        if not timed:
+            for key, instances in pending:
+                yield key, compare_endpoint_instances(instances, comparison_level, options)
+            return
+        yield from _collect_timed([_compare_endpoint_batch(pending, comparison_level, options, timed)], endpoint_times)
+        return
+    
+    # Shard into chunked batches; map() keeps the batches in submission order
+    batch_size = max(1, len(pending) // (workers * BATCHES_PER_WORKER))
+    batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(_compare_endpoint_batch, batches, repeat(comparison_level), repeat(options), repeat(timed))
+        if timed:
+            yield from _collect_timed(results, endpoint_times)
+            return
+        for batch_results in results:
+            yield from batch_results
+
+def _collect_timed(results, endpoint_times):
+    """Yield (key, differences) from timed batch results, storing each endpoint's seconds"""
+    for batch_results in results:
+        for key, differences, seconds in batch_results:
+            endpoint_times[key] = seconds
+            yield key, differences
+
+def _compare_endpoint_batch(batch, comparison_level, options, timed=False):
+    """Worker entry point: compare a batch of endpoints
+
+    Returns (key, differences) pairs, or (key, differences, seconds) when timed.
+    """
+    if not timed:
+        return [(key, compare_endpoint_instances(instances, comparison_level, options)) for key, instances in batch]
+    results = []
+    for key, instances in batch:
+        start = time.perf_counter()
+        differences = compare_endpoint_instances(instances, comparison_level, options)
+        results.append((key, differences, time.perf_counter() - start))
+    return results
+
 def process_entry(entry, endpoints):
     """Process a single entry and add it to endpoints"""
     if not isinstance(entry, dict):
@@ -97,9 +219,12 @@ def process_entry(entry, endpoints):
     # Extract response body
     response_body = entry.get("response_body", entry.get("response", {}).get("body", ""))
     if isinstance(response_body, dict):
-        response_body = json.dumps(response_body)
-    elif not isinstance(response_body, str):
-        response_body = str(response_body)
+        # Keep the parsed form; the text is only produced if something needs it
+        response_body = ResponseBody(parsed=response_body)
+    elif isinstance(response_body, str):
+        response_body = ResponseBody(response_body)
+    else:
+        response_body = ResponseBody(str(response_body))
     
     # Create endpoint entry
     endpoint_data = {
@@ -116,8 +241,74 @@ def process_entry(entry, endpoints):
     
     endpoints[key] = endpoint_data
 
-def compare_endpoint_instances(instances, comparison_level):
-    """Compare different instances of the same endpoint"""
+_UNSET = object()
+
+class ResponseBody:
+    """A response body held as raw text and/or parsed JSON.
+
+    Whichever form is missing is produced on first use and cached, so a
+    body is decoded at most once however many comparisons it takes part in.
+    """
+    __slots__ = ("_raw", "_parsed", "_error")
+    
+    def __init__(self, raw=None, parsed=_UNSET):
+        self._raw = raw
+        self._parsed = parsed
+        self._error = None
+    
+    @property
+    def raw(self):
+        """The body as text"""
+        if self._raw is None:
+            self._raw = json.dumps(self._parsed)
+        return self._raw
+    
+    def json(self):
+        """The parsed body; raises json.JSONDecodeError if it is not JSON"""
+        if self._parsed is _UNSET:
+            if self._error is not None:
+                raise self._error
+            try:
+                self._parsed = json.loads(self._raw)
+            except json.JSONDecodeError as e:
+                self._error = e
+                raise
+        return self._parsed
+    
+    def __getstate__(self):
+        # Ship a single form
+        if self._raw is not None:
+            return ("raw", self._raw)
+        return ("parsed", self._parsed)
+    
+    def __setstate__(self, state):
+        form, value = state
+        self._raw = value if form == "raw" else None
+        self._parsed = value if form == "parsed" else _UNSET
+        self._error = None
+    
+    def __eq__(self, other):
+        if isinstance(other, ResponseBody):
+            return self.raw == other.raw
+        return NotImplemented
+    
+    def __repr__(self):
+        return f"ResponseBody({self.raw[:40]!r})"
+
+def as_response_body(body):
+    """Wrap a plain str/dict body in a ResponseBody"""
+    if isinstance(body, ResponseBody):
+        return body
+    if isinstance(body, str):
+        return ResponseBody(body)
+    return ResponseBody(parsed=body)
+
+def compare_endpoint_instances(instances, comparison_level, options=None):
+    """Compare all instances of the same endpoint in a single pass
+
+    Every difference carries the value seen in each capture, keyed by file
+    label, so no capture's result is lost when more than two are compared.
+    """
     differences = {
         "status_codes": {},
         "headers": {},
@@ -129,127 +320,486 @@ def compare_endpoint_instances(instances, comparison_level):
     instance_labels = list(instances.keys())
     if len(instance_labels) < 2:
         return {}
+    instance_list = [instances[label] for label in instance_labels]
     
-    # Compare first instance with others
-    base_label = instance_labels[0]
-    base_instance = instances[base_label]
+    # Compare status codes
+    statuses = [instance["status"] for instance in instance_list]
+    if any(status != statuses[0] for status in statuses[1:]):
+        differences["status_codes"] = _value_mismatch(instance_labels, statuses)
     
-    for other_label in instance_labels[1:]:
-        other_instance = instances[other_label]
-        
-        # Compare status codes
-        if base_instance["status"] != other_instance["status"]:
-            differences["status_codes"] = {
-                "type": "value_mismatch",
-                base_label: base_instance["status"],
-                other_label: other_instance["status"]
-            }
-        
-        # Compare headers if detailed comparison
-        if comparison_level in ["detailed", "comprehensive"]:
-            header_diffs = compare_headers(
-                base_instance["request_headers"],
-                other_instance["request_headers"],
-                base_label,
-                other_label
+    # Compare headers if detailed comparison
+    if comparison_level in ["detailed", "comprehensive"]:
+        differences["headers"] = compare_headers_nway(
+            [instance["request_headers"] for instance in instance_list],
+            instance_labels,
+            (options or {}).get("ignore")
+        )
+    
+    # Compare response bodies if comprehensive comparison
+    if comparison_level == "comprehensive":
+        # Bodies parse lazily and cache the result, so each instance is decoded once
+        bodies = [as_response_body(instance["response_body"]) for instance in instance_list]
+        try:
+            body_diffs = compare_json_values_nway(
+                [body.json() for body in bodies],
+                instance_labels,
+                options
             )
-            if header_diffs:
-                differences["headers"].update(header_diffs)
-        
-        # Compare response bodies if comprehensive comparison
-        if comparison_level == "comprehensive":
-            try:
-                base_body = json.loads(base_instance["response_body"]) if isinstance(base_instance["response_body"], str) else base_instance["response_body"]
-                other_body = json.loads(other_instance["response_body"]) if isinstance(other_instance["response_body"], str) else other_instance["response_body"]
-                
-                body_diffs = compare_json_values(base_body, other_body, base_label, other_label)
-                if body_diffs:
-                    differences["response"] = body_diffs
-            except (json.JSONDecodeError, TypeError):
-                # If not JSON, compare as strings
-                if base_instance["response_body"] != other_instance["response_body"]:
-                    differences["response"] = {
-                        "type": "value_mismatch",
-                        base_label: base_instance["response_body"],
-                        other_label: other_instance["response_body"]
-                    }
+            if body_diffs:
+                differences["response"] = body_diffs
+        except (json.JSONDecodeError, TypeError, RecursionError):
+            # If not JSON (or nested too deeply to parse), compare as strings
+            raw_bodies = [body.raw for body in bodies]
+            if any(raw != raw_bodies[0] for raw in raw_bodies[1:]):
+                differences["response"] = _value_mismatch(instance_labels, raw_bodies)
     
     # Remove empty difference categories
     return {k: v for k, v in differences.items() if v}
 
+def _value_mismatch(labels, values):
+    """Build a value_mismatch record holding each label's value"""
+    record = {"type": "value_mismatch"}
+    record.update(zip(labels, values))
+    return record
+
 def compare_headers(headers1, headers2, label1, label2):
     """Compare two sets of headers"""
+    return compare_headers_nway([headers1, headers2], [label1, label2])
+
+def compare_headers_nway(header_sets, labels, ignore=None):
+    """Compare any number of header sets; missing headers read as ""
+
+    A header missing from some sets is recorded with change "removed" when
+    the first set has it and "added" otherwise.
+
+    ignore is optional IgnoreRules whose header rules are skipped.
+    """
     differences = {}
     
-    # Compare headers present in both
-    all_headers = set(headers1.keys()) | set(headers2.keys())
+    all_headers = {}
+    for headers in header_sets:
+        all_headers.update(dict.fromkeys(headers))
+    
     for header in all_headers:
-        value1 = headers1.get(header, "")
-        value2 = headers2.get(header, "")
-        
-        if value1 != value2:
-            differences[header] = {
-                "type": "value_mismatch",
-                label1: value1,
-                label2: value2
-            }
+        if ignore is not None and ignore.ignores_header(header):
+            continue
+        values = [headers.get(header, "") for headers in header_sets]
+        if any(value != values[0] for value in values[1:]):
+            differences[header] = _value_mismatch(labels, values)
+            if any(header not in headers for headers in header_sets):
+                differences[header]["change"] = "removed" if header in header_sets[0] else "added"
     
     return differences
 
-def compare_json_values(value1, value2, label1, label2):
+def compare_json_values(value1, value2, label1, label2, options=None):
     """Compare two JSON values recursively"""
-    if type(value1) != type(value2):
-        return {
-            "type": "value_mismatch",
-            label1: value1,
-            label2: value2
-        }
-    
-    if isinstance(value1, dict):
-        differences = {}
-        all_keys = set(value1.keys()) | set(value2.keys())
+    return compare_json_values_nway([value1, value2], [label1, label2], options)
+
+def compare_json_values_nway(values, labels, options=None):
+    """Compare any number of JSON values in a single traversal
+
+    Returns the nested shape compare_json_values always had: dict keys and
+    list indices lead to "value_mismatch" records, or a record on its own
+    when the roots differ. Each record holds the value seen under every
+    label, None where a key is missing; such records have change "removed"
+    when the first value has the key and "added" otherwise, as do list
+    items missing from some lists. Identical subtrees are skipped
+    without being walked.
+
+    options is an optional dict:
+      array_diff  "aligned" (default) matches up list items and reports
+                  only the added, removed and changed ones; "positional"
+                  compares by index and records lists of different
+                  lengths whole, as before.
+      array_key   identity key (e.g. "id") for matching dict items.
+      ignore      IgnoreRules (see ignore_rules.py); matching keys and
+                  list items are skipped without being walked.
+      max_depth   containers nested deeper than this are not walked
+                  (default MAX_DEPTH).
+      max_nodes   stop after walking this many containers (0 = no limit).
+      time_limit  stop after this many seconds (0 = no limit).
+    When a limit stops the walk, a record with change "truncated" marks
+    where, and the differences found so far are kept.
+    """
+    options = options or {}
+    ignore = options["ignore"].initial() if options.get("ignore") is not None else None
+    if ignore is IGNORED:
+        return None
+    records = []
+    state = _classify(values)
+    if state == _DESCEND:
+        _diff_nway(values, labels, records, options, ignore)
+    elif state == _MISMATCH:
+        records.append(((), _value_mismatch(labels, values)))
+    return nest_differences(records)
+
+# Outcomes of _classify
+_EQUAL, _MISMATCH, _DESCEND = range(3)
+
+def _classify(values):
+    """Equal values, a mismatch to record as is, or containers to walk
+
+    Containers are only walked when they differ. == runs in C and stops
+    at the first difference, so changed subtrees cost little to rule out;
+    equal ones are confirmed by their marshal serializations, which tell
+    apart what == does not (1, 1.0 and True). Differently ordered but
+    equal dicts, and values marshal cannot serialize or == cannot compare
+    this deep, are walked.
+    """
+    first = values[0]
+    kind = type(first)
+    if kind is dict or kind is list or isinstance(first, (dict, list)):
+        for value in values:
+            if type(value) is not kind:
+                return _MISMATCH
+        try:
+            for value in values[1:]:
+                if value != first:
+                    return _DESCEND
+            data = marshal.dumps(first, MARSHAL_VERSION)
+            for value in values[1:]:
+                if marshal.dumps(value, MARSHAL_VERSION) != data:
+                    return _DESCEND
+        except (ValueError, RecursionError):
+            return _DESCEND
+        return _EQUAL
+    for value in values:
+        if value != first or type(value) is not kind:
+            return _MISMATCH
+    return _EQUAL
+
+def _truncated_record(labels, reason):
+    """Mark where a comparison limit stopped the walk"""
+    record = _value_mismatch(labels, [f"not compared ({reason})"] * len(labels))
+    record["change"] = "truncated"
+    return record
+
+def _diff_nway(values, labels, records, options, ignore=None):
+    """Append (path, record) for every difference below same-typed containers
+
+    Walks with an explicit stack, so deep bodies cannot exhaust the
+    interpreter's recursion limit. Each stack entry is a container to walk
+    as (values, path, ignore state), or (None, path, record) for a
+    difference found after a sibling that is still to be walked, kept in
+    place so records come out in document order. The ignore state is None
+    when no rule can match.
+    """
+    rules = options.get("ignore")
+    array_diff = options.get("array_diff", "aligned")
+    array_key = options.get("array_key")
+    max_depth = options.get("max_depth", MAX_DEPTH)
+    max_nodes = options.get("max_nodes") or 0
+    time_limit = options.get("time_limit") or 0
+    deadline = time.perf_counter() + time_limit if time_limit else None
+    limited = bool(max_nodes) or deadline is not None
+    # Node count at which the limits are next checked
+    next_check = _next_limit_check(0, max_nodes, deadline)
+    
+    truncated = None
+    nodes = 0
+    stack = [(values, (), ignore)]
+    pop = stack.pop
+    while stack:
+        values, path, ignore = pop()
+        if values is None:
+            # A queued record; the third item is the record itself
+            records.append((path, ignore))
+            continue
+        first = values[0]
         
-        for key in all_keys:
-            if key not in value1:
-                differences[key] = {
-                    "type": "value_mismatch",
-                    label1: None,
-                    label2: value2[key]
-                }
-            elif key not in value2:
-                differences[key] = {
-                    "type": "value_mismatch",
-                    label1: value1[key],
-                    label2: None
-                }
+        if limited:
+            nodes += 1
+            if nodes == next_check:
+                if max_nodes and nodes > max_nodes:
+                    truncated = truncated or (path, "max_nodes")
+                    break
+                if deadline is not None and time.perf_counter() > deadline:
+                    truncated = truncated or (path, "time_limit")
+                    break
+                next_check = _next_limit_check(nodes, max_nodes, deadline)
+        
+        if len(path) >= max_depth:
+            # Skip this subtree but keep comparing its siblings
+            truncated = truncated or (path, "max_depth")
+            continue
+        
+        # Records go straight to records until a child is queued to be walked
+        children = []
+        child_rules = rules if ignore is not None else None
+        if isinstance(first, dict):
+            all_keys = first
+            for value in values:
+                if value.keys() != first.keys():
+                    all_keys = dict.fromkeys(first)
+                    for other in values:
+                        all_keys.update(dict.fromkeys(other))
+                    break
+            
+            for key in all_keys:
+                child_ignore = None
+                if child_rules is not None:
+                    child_ignore = child_rules.step(ignore, key)
+                    if child_ignore is IGNORED:
+                        continue
+                try:
+                    items = [value[key] for value in values]
+                except KeyError:
+                    # Key missing from some objects: removed if the first has it, else added
+                    record = _value_mismatch(labels, [value.get(key) for value in values])
+                    record["change"] = "removed" if key in first else "added"
+                    if children:
+                        children.append((None, path + (key,), record))
+                    else:
+                        records.append((path + (key,), record))
+                    continue
+                state = _classify(items)
+                if state == _DESCEND:
+                    children.append((items, path + (key,), child_ignore))
+                elif state == _MISMATCH:
+                    if children:
+                        children.append((None, path + (key,), _value_mismatch(labels, items)))
+                    else:
+                        records.append((path + (key,), _value_mismatch(labels, items)))
+        
+        else:
+            size = len(first)
+            same_length = all(len(value) == size for value in values)
+            
+            # Short lists of equal length gain nothing from alignment
+            if array_diff == "aligned" and (not same_length or size >= ALIGN_MIN_LENGTH):
+                rows, tokens = align_arrays(values, array_key, child_rules, ignore)
+                _diff_rows(values, labels, path, records, children, rows, tokens, child_rules, ignore)
+            elif not same_length:
+                records.append((path, _value_mismatch(labels, values)))
             else:
-                nested_diff = compare_json_values(value1[key], value2[key], label1, label2)
-                if nested_diff:
-                    differences[key] = nested_diff
+                for i, items in enumerate(zip(*values)):
+                    child_ignore = None
+                    if child_rules is not None:
+                        child_ignore = child_rules.step(ignore, i)
+                        if child_ignore is IGNORED:
+                            continue
+                    state = _classify(items)
+                    if state == _DESCEND:
+                        children.append((items, path + (i,), child_ignore))
+                    elif state == _MISMATCH:
+                        if children:
+                            children.append((None, path + (i,), _value_mismatch(labels, items)))
+                        else:
+                            records.append((path + (i,), _value_mismatch(labels, items)))
+        
+        # Reversed, so the first child is walked next
+        if children:
+            stack.extend(reversed(children))
+    
+    if truncated is not None:
+        # Keep the differences already found above the point where the walk stopped
+        records.extend((path, record) for values, path, record in reversed(stack) if values is None)
+        path, reason = truncated
+        records.append((path, _truncated_record(labels, reason)))
+
+def _next_limit_check(nodes, max_nodes, deadline):
+    """Node count at which _diff_nway next checks max_nodes and the deadline"""
+    checks = []
+    if max_nodes and nodes <= max_nodes:
+        checks.append(max_nodes + 1)
+    if deadline is not None:
+        checks.append(nodes + TIME_CHECK_INTERVAL)
+    return min(checks) if checks else -1
+
+def _diff_rows(values, labels, path, records, children, rows, tokens=None, rules=None, ignore=None):
+    """Add the work for aligned list items, as _diff_nway does; each row holds one item index per list or None
+
+    Rows whose items have equal tokens (see align_arrays) are identical
+    apart from ignored fields, and skipped.
+    """
+    for row in rows:
+        if tokens is not None and None not in row:
+            token = tokens[0][row[0]]
+            if all(other[i] == token for other, i in zip(tokens[1:], row[1:])):
+                # Tokens left out what the rules ignore at each item's own index
+                if rules is None or len({rules.step(ignore, i) for i in row}) == 1:
+                    continue
+        child_ignore = None
+        if rules is not None:
+            # Rules match an item by its index in the first list that has it
+            child_ignore = rules.step(ignore, next(i for i in row if i is not None))
+            if child_ignore is IGNORED:
+                continue
+        if None not in row:
+            items = [value[i] for value, i in zip(values, row)]
+            segment = row[0]
+            state = _classify(items)
+            if state == _DESCEND:
+                children.append((items, path + (segment,), child_ignore))
+            elif state == _MISMATCH:
+                record = _value_mismatch(labels, items)
+                if any(i != segment for i in row):
+                    # Item moved; say where it sits in each list
+                    record["change"] = "changed"
+                    record["indices"] = dict(zip(labels, row))
+                if children:
+                    children.append((None, path + (segment,), record))
+                else:
+                    records.append((path + (segment,), record))
+            continue
         
-        return differences if differences else None
-    
-    elif isinstance(value1, list):
-        if len(value1) != len(value2):
-            return {
-                "type": "value_mismatch",
-                label1: value1,
-                label2: value2
-            }
+        # Item missing from some lists: report it with its indices
+        if row[0] is not None:
+            segment = row[0]
+            change = "removed"
+        else:
+            owner = next(n for n, i in enumerate(row) if i is not None)
+            segment = f"+{labels[owner]}:{row[owner]}"
+            change = "added"
+        record = _value_mismatch(labels, [value[i] if i is not None else None for value, i in zip(values, row)])
+        record["change"] = change
+        record["indices"] = dict(zip(labels, row))
+        if children:
+            children.append((None, path + (segment,), record))
+        else:
+            records.append((path + (segment,), record))
+
+def align_arrays(values, array_key=None, rules=None, ignore=None):
+    """Align the items of several lists against the first one.
+
+    Returns (rows, tokens). Each row holds one item index per input list
+    (None where that list has no matching item). Items are matched by
+    array_key when every item is a dict with a unique scalar value for it;
+    otherwise by content, using a longest-matching-subsequence alignment
+    of item tokens. Items edited in place end up in the same row, so lists
+    of equal length without insertions line up positionally as before.
+    tokens holds each list's item tokens when matched by content (equal
+    tokens mean identical items), else None. With IgnoreRules and the
+    ignore state of the lists, the fields the rules ignore are left out
+    of the tokens, so items differing only there still line up.
+    """
+    if array_key is not None:
+        rows = _align_by_key(values, array_key)
+        if rows is not None:
+            return rows, None
+    if rules is not None and ignore is not None:
+        try:
+            values = [[_without_ignored(item, rules, rules.step(ignore, i)) for i, item in enumerate(value)]
+                      for value in values]
+        except RecursionError:
+            # Too deep to copy; align on the items as they are
+            pass
+    tokens = [_item_tokens(value) for value in values]
+    return _align_by_content(tokens), tokens
+
+def _align_by_key(values, array_key):
+    """Rows of items sharing the same identity key, or None if it does not apply"""
+    rows = {}
+    for n, value in enumerate(values):
+        seen = set()
+        for i, item in enumerate(value):
+            if not isinstance(item, dict) or array_key not in item:
+                return None
+            identity = item[array_key]
+            if isinstance(identity, (dict, list)):
+                return None
+            identity = (type(identity).__name__, identity)
+            if identity in seen:
+                return None
+            seen.add(identity)
+            if identity not in rows:
+                rows[identity] = [None] * len(values)
+            rows[identity][n] = i
+    return list(rows.values())
+
+def _align_by_content(tokens):
+    """Rows from aligning every list of item tokens against the first"""
+    base = tokens[0]
+    rows = [[i] + [None] * (len(tokens) - 1) for i in range(len(base))]
+    extra_rows = []
+    
+    for n in range(1, len(tokens)):
+        other = tokens[n]
         
-        differences = {}
-        for i, (item1, item2) in enumerate(zip(value1, value2)):
-            nested_diff = compare_json_values(item1, item2, label1, label2)
-            if nested_diff:
-                differences[str(i)] = nested_diff
+        # Trim the common prefix and suffix before running the matcher
+        start = 0
+        while start < len(base) and start < len(other) and base[start] == other[start]:
+            start += 1
+        end_base, end_other = len(base), len(other)
+        while end_base > start and end_other > start and base[end_base - 1] == other[end_other - 1]:
+            end_base -= 1
+            end_other -= 1
+        for i in range(start):
+            rows[i][n] = i
+        for offset in range(len(base) - end_base):
+            rows[end_base + offset][n] = end_other + offset
         
-        return differences if differences else None
+        matcher = difflib.SequenceMatcher(None, base[start:end_base], other[start:end_other], autojunk=False)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            i1, i2, j1, j2 = i1 + start, i2 + start, j1 + start, j2 + start
+            if tag == "equal":
+                for offset in range(i2 - i1):
+                    rows[i1 + offset][n] = j1 + offset
+            elif tag in ("replace", "insert"):
+                # Pair replaced items up as changed; leftovers are additions
+                paired = min(i2 - i1, j2 - j1)
+                for offset in range(paired):
+                    rows[i1 + offset][n] = j1 + offset
+                for j in range(j1 + paired, j2):
+                    row = [None] * len(tokens)
+                    row[n] = j
+                    extra_rows.append(row)
+    
+    return rows + extra_rows
+
+def _without_ignored(value, rules, ignore):
+    """A copy of value without the keys and items the rules ignore; value itself when none can be"""
+    if ignore is None or ignore is IGNORED:
+        return value
+    if isinstance(value, dict):
+        kept = {}
+        for key, item in value.items():
+            state = rules.step(ignore, key)
+            if state is not IGNORED:
+                kept[key] = _without_ignored(item, rules, state)
+        return kept
+    if isinstance(value, list):
+        kept = []
+        for i, item in enumerate(value):
+            state = rules.step(ignore, i)
+            if state is not IGNORED:
+                kept.append(_without_ignored(item, rules, state))
+        return kept
+    return value
+
+def _item_tokens(items):
+    """Hashable stand-ins for list items: equal tokens mean identical items
+
+    A token is the item's marshal serialization, which keeps types apart
+    (1, 1.0 and True differ); items marshal cannot serialize get a token
+    of their own.
+    """
+    dumps = marshal.dumps
+    try:
+        return [dumps(item, MARSHAL_VERSION) for item in items]
+    except ValueError:
+        pass
+    tokens = []
+    for item in items:
+        try:
+            tokens.append(dumps(item, MARSHAL_VERSION))
+        except ValueError:
+            tokens.append(("unserializable", id(item)))
+    return tokens
+
+def nest_differences(records):
+    """Fold flat (path, record) pairs into the nested difference dict"""
+    if not records:
+        return None
     
-    elif value1 != value2:
-        return {
-            "type": "value_mismatch",
-            label1: value1,
-            label2: value2
-        }
+    # A difference at the root stands on its own
+    if records[0][0] == ():
+        return records[0][1]
     
-    return None 
\ No newline at end of file
+    nested = {}
+    for path, record in records:
+        node = nested
+        for segment in path[:-1]:
+            node = node.setdefault(str(segment), {})
+        node[str(path[-1])] = record
+    return nested
@@ -1,60 +1,182 @@
 #!/usr/bin/env python3
-from flask import Flask, render_template, request, jsonify, abort
+from flask import Flask, Response, g, render_template, request, jsonify, abort, send_file, url_for
+from jinja2 import FileSystemBytecodeCache
+from werkzeug.http import is_resource_modified
+from werkzeug.serving import BaseWSGIServer
+import hashlib
 import json
 import os
+import sqlite3
 import sys
+import threading
+import time
 import argparse
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from blob_store import BLOB_DIR_NAME, DIGEST_RE, read_blob
+from atomic_files import atomic_open, private_dir
+from sqlite_store import (SQLITE_SUFFIX, load_comparison, load_endpoint, load_metadata, load_overview,
+                          query_endpoints)
+from comparison_cache import DEFAULT_CACHE_MB, PARSED_SIZE_FACTOR, ComparisonCache
+from comparison_format import (COMPARISON_SUFFIXES, ComparisonFormatError, json_equivalent_size, read_comparison,
+                               read_comparison_metadata)
+from index_log import INDEX_FILE
+from endpoint_query import (QueryError, build_endpoint_index, encode_cursor, parse_endpoint_query,
+                            project_endpoint, query_endpoint_index)
+from dashboard_metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, DashboardMetrics
 
 app = Flask(__name__)
 
 # Configuration
 DATA_DIR = "./dashboard_data"
 
+# Persisted index entries keyed by file name, with each file's mtime and size
+# (no .json suffix, so it is never mistaken for a comparison file)
+INDEX_CACHE_FILE = ".dashboard_index_cache"
+INDEX_CACHE_VERSION = 1
+
+# In-memory copy of the index cache, rebuilt when DATA_DIR changes
+_index_lock = threading.Lock()
+_index_state = {"data_dir": None, "files": {}, "comparisons": None}
+
+# Worker threads of the production server
+PRODUCTION_THREADS = 8
+
+# Precompressed sidecars of JSON comparisons, in order of preference
+PRECOMPRESSED_SUFFIXES = (("br", ".br"), ("gzip", ".gz"))
+
+# Parsed comparisons and endpoint indexes, shared by all routes
+comparison_cache = ComparisonCache()
+
+# Request and file-load metrics served at /metrics
+metrics = DashboardMetrics()
+
+@app.before_request
+def start_request_metrics():
+    metrics.request_started()
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    """Record latency (up to the response being built; file bodies stream after) and size"""
+    route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    metrics.observe_request(route, request.method, response.status_code,
+                            time.perf_counter() - g.request_started, response.content_length)
+    return response
+
+@app.teardown_request
+def finish_request_metrics(exc):
+    if "request_started" in g:
+        metrics.request_finished()
+
+@contextmanager
+def measure_file_load(file_path, kind):
+    """Record the time spent parsing a comparison file, with its size, in metrics"""
+    start = time.perf_counter()
+    yield
+    metrics.observe_file_load(os.path.basename(file_path), kind, os.path.getsize(file_path),
+                              time.perf_counter() - start)
+
 @app.route('/')
 def index():
     """Show the main dashboard page"""
-    # Load or create the index file
-    index_file = os.path.join(DATA_DIR, "index.json")
-    index_data = {"comparisons": []}
-    
-    # Scan the data directory for all JSON files
-    for filename in os.listdir(DATA_DIR):
-        if filename.endswith('.json') and filename != 'index.json':
-            file_path = os.path.join(DATA_DIR, filename)
-            
-            # Read the comparison file
-            try:
-                with open(file_path, 'r') as f:
-                    comparison_data = json.load(f)
-                    
-                # Extract metadata
-                metadata = comparison_data.get('metadata', {})
-                file_labels = metadata.get('file_labels', [])
+    comparisons = load_index_entries()
+    return render_template('index.html', comparisons=comparisons)
+
+def load_index_entries():
+    """Return index entries for all comparison files, newest first
+
+    Entries are kept in memory and in INDEX_CACHE_FILE keyed by each file's
+    (mtime, size), so only new or changed comparison files are read, and
+    the cache is rewritten only when something changed. The listing comes
+    from the files themselves, not from index.json, which is only updated
+    when the index log is compacted (see index_log.read_index).
+    """
+    with _index_lock:
+        if _index_state["data_dir"] != DATA_DIR:
+            _index_state["data_dir"] = DATA_DIR
+            _index_state["files"] = read_index_cache(os.path.join(DATA_DIR, INDEX_CACHE_FILE))
+            _index_state["comparisons"] = None
+        
+        cached_files = _index_state["files"]
+        files = {}
+        changed = False
+        
+        # Scan the data directory for all comparison files
+        with os.scandir(DATA_DIR) as it:
+            for dir_entry in it:
+                filename = dir_entry.name
+                if not filename.endswith(COMPARISON_SUFFIXES + (SQLITE_SUFFIX,)) or filename == INDEX_FILE:
+                    continue
+                try:
+                    stat = dir_entry.stat()
+                except OSError:
+                    continue
                 
-                # Create entry for index
-                entry = {
-                    "file": filename,
-                    "timestamp": metadata.get('comparison_time', datetime.now().isoformat()),
-                    "file_labels": file_labels,
-                    "metadata": metadata.get('custom_metadata', {}),
-                    "total_endpoints": metadata.get('total_endpoints', 0),
-                    "endpoints_with_changes": metadata.get('endpoints_with_changes', 0)
-                }
+                cached = cached_files.get(filename)
+                if cached and cached["mtime"] == stat.st_mtime_ns and cached["size"] == stat.st_size:
+                    files[filename] = cached
+                    continue
                 
-                index_data["comparisons"].append(entry)
-            except (json.JSONDecodeError, IOError) as e:
-                print(f"Error processing {filename}: {str(e)}")
-                continue
-    
-    # Sort by timestamp (newest first)
-    index_data["comparisons"].sort(key=lambda x: x["timestamp"], reverse=True)
-    
-    # Save the updated index
-    with open(index_file, 'w') as f:
-        json.dump(index_data, f, indent=2)
+                files[filename] = {
+                    "mtime": stat.st_mtime_ns,
+                    "size": stat.st_size,
+                    "entry": read_index_entry(filename, dir_entry.path)
+                }
+                changed = True
+        
+        # Deleted files also change the index
+        if files.keys() != cached_files.keys():
+            changed = True
+        
+        if changed or _index_state["comparisons"] is None:
+            # Files that failed to parse are cached as None so they are not re-read
+            comparisons = [f["entry"] for f in files.values() if f["entry"] is not None]
+            # Sort by timestamp (newest first)
+            comparisons.sort(key=lambda x: x["timestamp"], reverse=True)
+            _index_state["files"] = files
+            _index_state["comparisons"] = comparisons
+        
+        if changed:
+            with atomic_open(os.path.join(DATA_DIR, INDEX_CACHE_FILE), 'w') as f:
+                json.dump({"version": INDEX_CACHE_VERSION, "files": files}, f)
+        
+        return _index_state["comparisons"]
+
+def read_index_entry(filename, file_path):
+    """Read one comparison file and build its index entry (None if unreadable)"""
+    try:
+        with measure_file_load(file_path, "metadata"):
+            if file_path.endswith(SQLITE_SUFFIX):
+                # Only the metadata table is read
+                metadata = load_metadata(file_path)
+            else:
+                metadata = read_comparison_metadata(file_path)
+    except (ComparisonFormatError, sqlite3.DatabaseError, IOError) as e:
+        print(f"Error processing {filename}: {str(e)}")
+        return None
     
-    return render_template('index.html', comparisons=index_data["comparisons"])
+    # Create entry for index
+    return {
+        "file": filename,
+        "timestamp": metadata.get('comparison_time', datetime.now().isoformat()),
+        "file_labels": metadata.get('file_labels', []),
+        "metadata": metadata.get('custom_metadata', {}),
+        "total_endpoints": metadata.get('total_endpoints', 0),
+        "endpoints_with_changes": metadata.get('endpoints_with_changes', 0)
+    }
+
+def read_index_cache(cache_file):
+    """Load the persisted index cache, or an empty one if missing or stale"""
+    try:
+        with open(cache_file, 'r') as f:
+            cache = json.load(f)
+    except (json.JSONDecodeError, IOError):
+        return {}
+    if not isinstance(cache, dict) or cache.get("version") != INDEX_CACHE_VERSION:
+        return {}
+    return cache.get("files", {})
 
 @app.route('/comparison/<filename>')
 def comparison_detail(filename):
@@ -63,13 +185,18 @@ def comparison_detail(filename):
     if not os.path.exists(file_path):
         abort(404)
     
-    with open(file_path, 'r') as f:
-        try:
-            comparison_data = json.load(f)
-        except json.JSONDecodeError:
-            return render_template('error.html', message="Invalid comparison file format.")
+    # Endpoints and their differences are fetched by the page as needed
+    try:
+        if file_path.endswith(SQLITE_SUFFIX):
+            metadata, counts = load_overview(file_path)
+        else:
+            endpoint_index = get_endpoint_index(file_path)
+            metadata = endpoint_index["metadata"]
+            counts = {status: len(keys) for status, keys in endpoint_index["by_field"]["status"].items()}
+    except (ComparisonFormatError, sqlite3.DatabaseError):
+        return render_template('error.html', message="Invalid comparison file format.")
     
-    return render_template('comparison.html', data=comparison_data)
+    return render_template('comparison.html', data={"metadata": metadata, "counts": counts}, filename=filename)
 
 @app.route('/api/comparison/<filename>')
 def api_comparison(filename):
@@ -78,17 +205,78 @@ def api_comparison(filename):
     if not os.path.exists(file_path):
         abort(404)
     
-    with open(file_path, 'r') as f:
+    if file_path.endswith('.json'):
+        # JSON comparisons are sent straight from disk, precompressed when possible
+        return send_comparison_file(file_path)
+    
+    # SQLite and binary comparisons are decoded and sent as JSON
+    def build():
         try:
-            comparison_data = json.load(f)
-        except json.JSONDecodeError:
+            return jsonify(load_comparison_file(file_path))
+        except (ComparisonFormatError, sqlite3.DatabaseError):
             return jsonify({"error": "Invalid comparison file format"}), 500
+    return conditional_response(file_path, build)
+
+def send_comparison_file(file_path):
+    """Send a JSON comparison file, using a .br or .gz sidecar the client accepts
+
+    Sidecars are only used when they are newer than the file. ETags are
+    derived from the file identity (plus the encoding), so unchanged
+    files answer conditional requests with 304.
+    """
+    stat = os.stat(file_path)
+    for encoding, suffix in PRECOMPRESSED_SUFFIXES:
+        if not request.accept_encodings[encoding]:
+            continue
+        try:
+            sidecar_stat = os.stat(file_path + suffix)
+        except OSError:
+            continue
+        if sidecar_stat.st_mtime_ns < stat.st_mtime_ns:
+            continue
+        response = send_file(file_path + suffix, mimetype="application/json",
+                             etag=file_etag(stat, encoding), last_modified=stat.st_mtime)
+        response.headers["Content-Encoding"] = encoding
+        response.headers["Vary"] = "Accept-Encoding"
+        return response
     
-    return jsonify(comparison_data)
+    response = send_file(file_path, mimetype="application/json", etag=file_etag(stat), last_modified=stat.st_mtime)
+    response.headers["Vary"] = "Accept-Encoding"
+    return response
+
+def file_etag(stat, variant=None):
+    """Return a strong ETag value for a file identity and representation variant"""
+    etag = f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+    return f"{etag}-{variant}" if variant else etag
+
+def conditional_response(file_path, build, variant=None):
+    """Answer with 304 if the client's copy is current, otherwise build() the response
+
+    Validators come from the file identity; variant distinguishes responses
+    built from the same file, such as different query strings.
+    """
+    stat = os.stat(file_path)
+    etag = file_etag(stat, variant)
+    last_modified = datetime.fromtimestamp(stat.st_mtime, timezone.utc)
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = Response(status=304)
+    else:
+        response = app.make_response(build())
+        if response.status_code != 200:
+            return response
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    return response
 
 @app.route('/api/endpoints')
 def api_endpoints():
-    """API endpoint to get all endpoints from a comparison"""
+    """API endpoint to get the endpoints of a comparison
+
+    Optional filters: status, change_type, host, method, path_prefix and
+    path_regex. fields selects endpoint fields (e.g. fields=method,path,status).
+    With limit, endpoints are paged in key order and the X-Next-Cursor
+    header (and a Link rel="next") carries the cursor of the next page.
+    """
     filename = request.args.get('file')
     if not filename:
         return jsonify({"error": "No file specified"}), 400
@@ -97,16 +285,131 @@ def api_endpoints():
     if not os.path.exists(file_path):
         return jsonify({"error": "File not found"}), 404
     
-    with open(file_path, 'r') as f:
+    try:
+        query = parse_endpoint_query(request.args)
+    except QueryError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    return conditional_response(file_path, lambda: build_endpoints_response(file_path, query), query_variant())
+
+def build_endpoints_response(file_path, query):
+    """Run an /api/endpoints query and build its response"""
+    try:
+        if file_path.endswith(SQLITE_SUFFIX):
+            # Only the matching rows are read from the database
+            fields = query["fields"]
+            endpoints, next_key = query_endpoints(
+                file_path,
+                **{name: query[name] for name in ("host", "method", "status", "change_type", "path_prefix",
+                                                  "path_regex", "after", "limit")},
+                with_differences=fields is None or "differences" in fields
+            )
+            endpoints = {key: project_endpoint(endpoint, fields) for key, endpoint in endpoints.items()}
+        else:
+            endpoints, next_key = query_endpoint_index(get_endpoint_index(file_path), query)
+    except (ComparisonFormatError, sqlite3.DatabaseError):
+        return jsonify({"error": "Invalid comparison file format"}), 500
+    
+    response = jsonify(endpoints)
+    if next_key is not None:
+        cursor = encode_cursor(next_key)
+        args = request.args.to_dict()
+        args["cursor"] = cursor
+        response.headers["X-Next-Cursor"] = cursor
+        response.headers["Link"] = f'<{url_for("api_endpoints", **args)}>; rel="next"'
+    return response
+
+def get_endpoint_index(file_path):
+    """Return the endpoint index of a file comparison from the comparison cache
+
+    The index holds the parsed comparison too, so a file is parsed once
+    until it changes or is evicted.
+    """
+    return comparison_cache.get(file_path, read_endpoint_index, weigh=weigh_comparison)
+
+def weigh_comparison(file_path):
+    """Estimate the memory of a parsed comparison, weighing binary and compressed files as JSON"""
+    return json_equivalent_size(file_path) * PARSED_SIZE_FACTOR
+
+def read_endpoint_index(file_path):
+    """Parse a JSON, MessagePack or CBOR comparison and index its endpoints"""
+    with measure_file_load(file_path, "comparison"):
+        comparison = read_comparison(file_path)
+    return build_endpoint_index(comparison)
+
+@app.route('/api/endpoint')
+def api_endpoint():
+    """API endpoint to get a single endpoint of a comparison by key"""
+    filename = request.args.get('file')
+    key = request.args.get('key')
+    if not filename or not key:
+        return jsonify({"error": "No file or key specified"}), 400
+    
+    file_path = os.path.join(DATA_DIR, filename)
+    if not os.path.exists(file_path):
+        return jsonify({"error": "File not found"}), 404
+    
+    def build():
         try:
-            comparison_data = json.load(f)
-            endpoints = comparison_data.get("endpoints", {})
-            return jsonify(endpoints)
-        except json.JSONDecodeError:
+            if file_path.endswith(SQLITE_SUFFIX):
+                endpoint = load_endpoint(file_path, key)
+            else:
+                endpoint = get_endpoint_index(file_path)["endpoints"].get(key)
+        except (ComparisonFormatError, sqlite3.DatabaseError):
             return jsonify({"error": "Invalid comparison file format"}), 500
+        
+        if endpoint is None:
+            return jsonify({"error": "Endpoint not found"}), 404
+        return jsonify(endpoint)
+    return conditional_response(file_path, build, query_variant())
+
+def query_variant():
+    """Return an ETag variant identifying the request's query string"""
+    return hashlib.sha1(request.query_string).hexdigest()[:16]
+
+def load_comparison_file(file_path):
+    """Load a whole comparison from a comparison file of any format, through the cache"""
+    if file_path.endswith(SQLITE_SUFFIX):
+        return comparison_cache.get(file_path, read_sqlite_comparison)
+    return get_endpoint_index(file_path)["comparison"]
+
+def read_sqlite_comparison(file_path):
+    with measure_file_load(file_path, "comparison"):
+        return load_comparison(file_path)
+
+@app.route('/api/blob/<digest>')
+def api_blob(digest):
+    """API endpoint to get a value stored in the blob store by digest"""
+    if not DIGEST_RE.match(digest):
+        return jsonify({"error": "Invalid digest"}), 400
+
+    # Blobs are gzip on disk, so send them as-is to clients that accept it
+    accepts_gzip = bool(request.accept_encodings["gzip"])
+    try:
+        data = read_blob(os.path.join(DATA_DIR, BLOB_DIR_NAME), digest, decompress=not accepts_gzip)
+    except FileNotFoundError:
+        return jsonify({"error": "Blob not found"}), 404
+
+    response = Response(data, mimetype="application/json")
+    if accepts_gzip:
+        response.headers["Content-Encoding"] = "gzip"
+    # Content under a digest never changes
+    response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    response.headers["Vary"] = "Accept-Encoding"
+    return response
+
+@app.route('/api/cache_stats')
+def api_cache_stats():
+    """API endpoint to get the comparison cache hit/miss counters"""
+    return jsonify(comparison_cache.stats())
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Route latencies, response sizes, file parsing and cache counters in Prometheus text format"""
+    return Response(metrics.render(comparison_cache.stats()), content_type=METRICS_CONTENT_TYPE)
 
 def create_template_files():
-    """Create the template files for the dashboard"""
+    """Create any missing template files for the dashboard"""
     templates_dir = os.path.join(os.path.dirname(__file__), 'templates')
     if not os.path.exists(templates_dir):
         os.makedirs(templates_dir)
@@ -191,7 +494,7 @@ def create_template_files():
 """
     
     # Create comparison detail template
-    comparison_template = """{% extends "base.html" %}
+    comparison_template = r"""{% extends "base.html" %}
 
 {% block content %}
     <h1>API Comparison Details</h1>
@@ -228,16 +531,18 @@ def create_template_files():
             <div class="card mb-4">
                 <div class="card-header d-flex justify-content-between">
                     <h5>Endpoints</h5>
-                    <div class="btn-group">
-                        <button class="btn btn-sm btn-outline-primary" onclick="filterEndpoints('all')">All</button>
-                        <button class="btn btn-sm btn-outline-warning" onclick="filterEndpoints('changed')">Changed</button>
-                        <button class="btn btn-sm btn-outline-success" onclick="filterEndpoints('unchanged')">Unchanged</button>
-                        <button class="btn btn-sm btn-outline-info" onclick="filterEndpoints('added')">Added</button>
-                        <button class="btn btn-sm btn-outline-danger" onclick="filterEndpoints('removed')">Removed</button>
+                    <div class="d-flex">
+                        <input type="search" id="endpointSearch" class="form-control form-control-sm me-2" placeholder="Filter by path">
+                        <div class="btn-group">
+                            <button class="btn btn-sm btn-outline-primary" onclick="filterEndpoints('all')">All</button>
+                            <button class="btn btn-sm btn-outline-warning" onclick="filterEndpoints('changed')">Changed</button>
+                            <button class="btn btn-sm btn-outline-success" onclick="filterEndpoints('unchanged')">Unchanged</button>
+                        </div>
                     </div>
                 </div>
                 <div class="card-body">
-                    <div class="table-responsive">
+                    <!-- Rows are fetched page by page and only the visible ones are rendered -->
+                    <div class="table-responsive endpoints-scroll" id="endpointsScroll">
                         <table class="table table-hover" id="endpointsTable">
                             <thead>
                                 <tr>
@@ -248,40 +553,21 @@ def create_template_files():
                                     <th>Details</th>
                                 </tr>
                             </thead>
-                            <tbody>
-                                {% for key, endpoint in data.endpoints.items() %}
-                                <tr class="endpoint-{{ endpoint.status }} {% if endpoint.present_in|length == 1 %}{% if endpoint.present_in[0] == data.metadata.file_labels[0] %}endpoint-removed{% else %}endpoint-added{% endif %}{% endif %}">
-                                    <td>{{ endpoint.method }}</td>
-                                    <td>{{ endpoint.host }}</td>
-                                    <td>{{ endpoint.path }}</td>
-                                    <td>
-                                        {% if endpoint.status == 'changed' %}
-                                            <span class="badge bg-warning">Changed</span>
-                                        {% elif endpoint.status == 'unchanged' %}
-                                            <span class="badge bg-success">Unchanged</span>
-                                        {% elif endpoint.present_in|length == 1 %}
-                                            {% if endpoint.present_in[0] == data.metadata.file_labels[0] %}
-                                                <span class="badge bg-danger">Removed</span>
-                                            {% else %}
-                                                <span class="badge bg-primary">Added</span>
-                                            {% endif %}
-                                        {% endif %}
-                                    </td>
-                                    <td>
-                                        {% if endpoint.status == 'changed' %}
-                                            <button class="btn btn-sm btn-outline-secondary" onclick="showDetails('{{ key }}')">View Differences</button>
-                                        {% endif %}
-                                    </td>
-                                </tr>
-                                {% endfor %}
-                            </tbody>
+                            <tbody></tbody>
                         </table>
                     </div>
+                    <div class="text-muted small mt-2" id="endpointsStatus">Loading endpoints...</div>
                 </div>
             </div>
         </div>
     </div>
     
+    <style>
+        .endpoints-scroll { max-height: 640px; overflow-y: auto; }
+        .endpoints-scroll thead th { position: sticky; top: 0; background: #fff; z-index: 1; }
+        .endpoints-scroll tr.endpoint-row td { height: 41px; white-space: nowrap; max-width: 480px; overflow: hidden; text-overflow: ellipsis; }
+    </style>
+    
     <!-- Modal for displaying differences -->
     <div class="modal fade" id="differencesModal" tabindex="-1" aria-hidden="true">
         <div class="modal-dialog modal-lg">
@@ -308,19 +594,15 @@ def create_template_files():
     const changesChart = new Chart(ctx, {
         type: 'pie',
         data: {
-            labels: ['Changed', 'Unchanged', 'Added', 'Removed'],
+            labels: ['Changed', 'Unchanged'],
             datasets: [{
                 data: [
-                    {{ data.summary.by_change_type.modified|length }},
-                    {{ data.metadata.total_endpoints - data.summary.by_change_type.modified|length - data.summary.by_change_type.added|length - data.summary.by_change_type.removed|length }},
-                    {{ data.summary.by_change_type.added|length }},
-                    {{ data.summary.by_change_type.removed|length }}
+                    {{ data.counts.get("changed", 0) }},
+                    {{ data.metadata.total_endpoints - data.counts.get("changed", 0) }}
                 ],
                 backgroundColor: [
                     '#ffc107',  // Changed - warning
                     '#198754',  // Unchanged - success
-                    '#0d6efd',  // Added - primary
-                    '#dc3545'   // Removed - danger
                 ]
             }]
         },
@@ -334,75 +616,301 @@ def create_template_files():
         }
     });
     
+    // Endpoint table state; rows are fetched from /api/endpoints a page at a time
+    const comparisonFile = {{ filename|tojson }};
+    const PAGE_SIZE = 200;
+    const ROW_HEIGHT = 41;
+    const OVERSCAN = 10;
+    const tableState = {status: null, search: '', rows: [], cursor: null, done: false, loading: false, generation: 0};
+    
+    // Build the /api/endpoints URL for the current filters
+    function endpointsUrl(cursor) {
+        const params = new URLSearchParams({file: comparisonFile, fields: 'method,host,path,status', limit: PAGE_SIZE});
+        if (tableState.status) {
+            params.set('status', tableState.status);
+        }
+        if (tableState.search) {
+            // Plain substring match on the path
+            params.set('path_regex', tableState.search.replace(/[.*+?^${}()|[\]\\]/g, '\\$&'));
+        }
+        if (cursor) {
+            params.set('cursor', cursor);
+        }
+        return `/api/endpoints?${params}`;
+    }
+    
+    // Fetch the next page of endpoints for the current filters
+    async function loadMoreEndpoints() {
+        if (tableState.loading || tableState.done) {
+            return;
+        }
+        tableState.loading = true;
+        const generation = tableState.generation;
+        try {
+            const response = await fetch(endpointsUrl(tableState.cursor));
+            if (generation !== tableState.generation) {
+                return;  // Filters changed while this page was loading
+            }
+            if (!response.ok) {
+                tableState.done = true;
+                document.getElementById('endpointsStatus').textContent = 'Failed to load endpoints.';
+                return;
+            }
+            const page = await response.json();
+            if (generation !== tableState.generation) {
+                return;
+            }
+            for (const [key, endpoint] of Object.entries(page)) {
+                tableState.rows.push([key, endpoint]);
+            }
+            tableState.cursor = response.headers.get('X-Next-Cursor');
+            tableState.done = !tableState.cursor;
+        } finally {
+            if (generation === tableState.generation) {
+                tableState.loading = false;
+            }
+        }
+        renderVisibleRows();
+    }
+    
+    // Render one endpoint row
+    function renderEndpointRow(key, endpoint) {
+        const changed = endpoint.status === 'changed';
+        return `
+            <tr class="endpoint-row ${changed ? 'endpoint-changed' : 'endpoint-unchanged'}">
+                <td>${escapeHtml(endpoint.method)}</td>
+                <td>${escapeHtml(endpoint.host)}</td>
+                <td title="${escapeHtml(endpoint.path)}">${escapeHtml(endpoint.path)}</td>
+                <td>${changed ? '<span class="badge bg-warning">Changed</span>' : '<span class="badge bg-success">Unchanged</span>'}</td>
+                <td>${changed ? `<button class="btn btn-sm btn-outline-secondary" data-key="${escapeHtml(key)}" onclick="showDetails(this.dataset.key)">View Differences</button>` : ''}</td>
+            </tr>`;
+    }
+    
+    // Render only the rows in (and just around) the scrolled viewport
+    function renderVisibleRows() {
+        const container = document.getElementById('endpointsScroll');
+        const rows = tableState.rows;
+        const first = Math.max(0, Math.floor(container.scrollTop / ROW_HEIGHT) - OVERSCAN);
+        const last = Math.min(rows.length, first + Math.ceil(container.clientHeight / ROW_HEIGHT) + 2 * OVERSCAN);
+        
+        let html = `<tr style="height: ${first * ROW_HEIGHT}px"></tr>`;
+        for (let i = first; i < last; i++) {
+            html += renderEndpointRow(rows[i][0], rows[i][1]);
+        }
+        html += `<tr style="height: ${(rows.length - last) * ROW_HEIGHT}px"></tr>`;
+        document.getElementById('endpointsTable').getElementsByTagName('tbody')[0].innerHTML = html;
+        
+        let status = `${rows.length} endpoint${rows.length === 1 ? '' : 's'}`;
+        if (!tableState.done) {
+            status += ' loaded, scroll for more';
+        } else if (!rows.length) {
+            status = 'No endpoints match.';
+        }
+        document.getElementById('endpointsStatus').textContent = status;
+        
+        // Fetch the next page before the user reaches the end
+        if (!tableState.done && last >= rows.length - OVERSCAN) {
+            loadMoreEndpoints();
+        }
+    }
+    
+    // Start over with new filters
+    function resetEndpoints() {
+        Object.assign(tableState, {rows: [], cursor: null, done: false, loading: false, generation: tableState.generation + 1});
+        document.getElementById('endpointsScroll').scrollTop = 0;
+        loadMoreEndpoints();
+    }
+    
     // Filter endpoints by type
     function filterEndpoints(type) {
-        const table = document.getElementById('endpointsTable');
-        const rows = table.getElementsByTagName('tbody')[0].getElementsByTagName('tr');
-        
-        for (let i = 0; i < rows.length; i++) {
-            const row = rows[i];
-            
-            if (type === 'all') {
-                row.style.display = '';
-            } else if (type === 'changed' && row.classList.contains('endpoint-changed')) {
-                row.style.display = '';
-            } else if (type === 'unchanged' && row.classList.contains('endpoint-unchanged')) {
-                row.style.display = '';
-            } else if (type === 'added' && row.classList.contains('endpoint-added')) {
-                row.style.display = '';
-            } else if (type === 'removed' && row.classList.contains('endpoint-removed')) {
-                row.style.display = '';
+        tableState.status = type === 'all' ? null : type;
+        resetEndpoints();
+    }
+    
+    let scrollScheduled = false;
+    document.getElementById('endpointsScroll').addEventListener('scroll', () => {
+        if (!scrollScheduled) {
+            scrollScheduled = true;
+            requestAnimationFrame(() => {
+                scrollScheduled = false;
+                renderVisibleRows();
+            });
+        }
+    });
+    
+    let searchTimer = null;
+    document.getElementById('endpointSearch').addEventListener('input', event => {
+        clearTimeout(searchTimer);
+        searchTimer = setTimeout(() => {
+            tableState.search = event.target.value.trim();
+            resetEndpoints();
+        }, 250);
+    });
+    
+    loadMoreEndpoints();
+    
+    // Escape text for safe insertion into HTML
+    function escapeHtml(text) {
+        return String(text).replace(/[&<>"']/g, c => ({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'}[c]));
+    }
+    
+    // Flatten nested differences into [path, record] pairs
+    function flattenDifferences(node, path, out) {
+        if (node && typeof node === 'object') {
+            if (node.type === 'value_mismatch') {
+                // Aligned list items say whether they were added or removed
+                const label = path || '(body)';
+                out.push([node.change && node.change !== 'changed' ? `${label} (${node.change})` : label, node]);
             } else {
-                row.style.display = 'none';
+                for (const [key, child] of Object.entries(node)) {
+                    flattenDifferences(child, path ? `${path}.${key}` : key, out);
+                }
+            }
+        }
+        return out;
+    }
+    
+    // Group compact {pointer, kind, values} records by their first pointer segment
+    function groupCompactRecords(compact) {
+        const groups = {};
+        for (const record of compact.records) {
+            const segments = record.pointer.split('/').slice(1).map(s => s.replace(/~1/g, '/').replace(/~0/g, '~'));
+            const section = segments.shift();
+            const label = segments.join('.') || (section === 'status_codes' ? 'status' : '(body)');
+            (groups[section] = groups[section] || []).push([record.kind !== 'changed' ? `${label} (${record.kind})` : label, record.values]);
+        }
+        return groups;
+    }
+    
+    // Format a cell value as HTML; oversized values were replaced by a digest
+    const blobStore = {{ data.metadata.get("blob_store")|tojson }};
+    function formatDiffValue(value) {
+        if (value && typeof value === 'object' && '$digest' in value) {
+            const digest = escapeHtml(value.$digest);
+            // Link to the full value when it was kept in the blob store
+            const label = blobStore ? `<a href="/api/blob/${digest}" target="_blank">${digest}</a>` : digest;
+            return `${label} (${value.$length} bytes, omitted)`;
+        }
+        return escapeHtml(typeof value === 'string' ? value : JSON.stringify(value, null, 2));
+    }
+    
+    // Render difference records as a table with one column per capture
+    function renderDiffTable(title, iconClass, records, versions) {
+        let html = `
+            <div class="card mb-4">
+                <div class="card-header d-flex justify-content-between align-items-center">
+                    <h6 class="mb-0">
+                        <i class="bi bi-circle-fill ${iconClass} me-2"></i>
+                        ${title}
+                    </h6>
+                </div>
+                <div class="table-responsive">
+                    <table class="table table-bordered mb-0">
+                        <thead class="table-light">
+                            <tr>
+                                <th style="width: 20%">Field</th>
+                                ${versions.map(version => `<th>${escapeHtml(version)}</th>`).join('')}
+                            </tr>
+                        </thead>
+                        <tbody>`;
+        
+        for (const [field, record] of records) {
+            html += `
+                            <tr>
+                                <td class="fw-bold">${escapeHtml(field)}</td>`;
+            for (const version of versions) {
+                const value = record[version];
+                html += `
+                                <td class="bg-warning bg-opacity-10">
+                                    <pre class="mb-0"><code>${formatDiffValue(value)}</code></pre>
+                                </td>`;
             }
+            html += `
+                            </tr>`;
         }
+        
+        html += `
+                        </tbody>
+                    </table>
+                </div>
+            </div>`;
+        return html;
     }
     
-    // Show differences for an endpoint
-    function showDetails(endpointKey) {
-        const endpoints = {{ data.endpoints|tojson }};
-        const endpoint = endpoints[endpointKey];
+    // Show differences for an endpoint, fetched on demand
+    async function showDetails(endpointKey) {
+        const modalBody = document.getElementById('differencesModalBody');
+        modalBody.innerHTML = '<div class="text-muted">Loading differences...</div>';
+        new bootstrap.Modal(document.getElementById('differencesModal')).show();
+        
+        const response = await fetch(`/api/endpoint?${new URLSearchParams({file: comparisonFile, key: endpointKey})}`);
+        if (!response.ok) {
+            modalBody.innerHTML = '<div class="alert alert-danger">Failed to load the differences of this endpoint.</div>';
+            return;
+        }
+        const endpoint = await response.json();
         const differences = endpoint.differences;
+        const versions = endpoint.present_in;
         
-        let html = `<h6>${endpoint.method} ${endpoint.host}${endpoint.path}</h6>`;
+        let html = `
+            <div class="endpoint-header p-3 bg-light border-bottom mb-4">
+                <div class="d-flex justify-content-between align-items-center">
+                    <h5 class="mb-0">
+                        <span class="badge bg-secondary me-2">${escapeHtml(endpoint.method)}</span>
+                        <span class="text-muted">${escapeHtml(endpoint.host)}</span>${escapeHtml(endpoint.path)}
+                    </h5>
+                </div>
+            </div>`;
         
-        if (differences) {
-            // Status codes
-            if (differences.status_codes) {
-                html += `<h6 class="mt-3">Status Codes</h6>`;
-                html += `<div class="table-responsive"><table class="table table-sm">`;
-                html += `<tr><th>Version</th><th>Status</th></tr>`;
-                
-                for (const [key, value] of Object.entries(differences.status_codes)) {
-                    html += `<tr><td>${key}</td><td>${value}</td></tr>`;
+        if (differences && differences.format === 'compact') {
+            const groups = groupCompactRecords(differences);
+            const sections = [
+                ['status_codes', 'Status Code Changes', 'text-warning'],
+                ['response', 'Response Differences', 'text-primary'],
+                ['headers', 'Header Differences', 'text-success'],
+                ['request', 'Request Differences', 'text-danger']
+            ];
+            for (const [key, title, iconClass] of sections) {
+                if (groups[key]) {
+                    html += renderDiffTable(title, iconClass, groups[key], versions);
                 }
-                
-                html += `</table></div>`;
             }
-            
-            // Request differences
-            if (differences.request && Object.keys(differences.request).length > 0) {
-                html += `<h6 class="mt-3">Request Differences</h6>`;
-                html += `<pre class="bg-light p-3"><code>${JSON.stringify(differences.request, null, 2)}</code></pre>`;
+            if (differences.truncated) {
+                html += `
+                <div class="alert alert-warning">
+                    <i class="bi bi-exclamation-triangle me-2"></i>
+                    Showing ${differences.records.length} of ${differences.total_records} differences; the rest were dropped to keep the file small.
+                </div>`;
+            }
+        } else if (differences && Object.keys(differences).length > 0) {
+            // Status codes
+            if (differences.status_codes && Object.keys(differences.status_codes).length > 0) {
+                html += renderDiffTable('Status Code Changes', 'text-warning', [['status', differences.status_codes]], versions);
             }
             
             // Response differences
             if (differences.response && Object.keys(differences.response).length > 0) {
-                html += `<h6 class="mt-3">Response Differences</h6>`;
-                html += `<pre class="bg-light p-3"><code>${JSON.stringify(differences.response, null, 2)}</code></pre>`;
+                html += renderDiffTable('Response Differences', 'text-primary', flattenDifferences(differences.response, '', []), versions);
             }
             
             // Header differences
             if (differences.headers && Object.keys(differences.headers).length > 0) {
-                html += `<h6 class="mt-3">Header Differences</h6>`;
-                html += `<pre class="bg-light p-3"><code>${JSON.stringify(differences.headers, null, 2)}</code></pre>`;
+                html += renderDiffTable('Header Differences', 'text-success', flattenDifferences(differences.headers, '', []), versions);
+            }
+            
+            // Request differences
+            if (differences.request && Object.keys(differences.request).length > 0) {
+                html += renderDiffTable('Request Differences', 'text-danger', flattenDifferences(differences.request, '', []), versions);
             }
         } else {
-            html += `<p>No detailed differences available.</p>`;
+            html += `
+                <div class="alert alert-info">
+                    <i class="bi bi-info-circle me-2"></i>
+                    No differences found for this endpoint.
+                </div>`;
         }
         
-        document.getElementById('differencesModalBody').innerHTML = html;
-        new bootstrap.Modal(document.getElementById('differencesModal')).show();
+        modalBody.innerHTML = html;
     }
 </script>
 {% endblock %}
@@ -420,18 +928,18 @@ def create_template_files():
 {% endblock %}
 """
     
-    # Write templates to files
-    with open(os.path.join(templates_dir, 'base.html'), 'w') as f:
-        f.write(base_template)
-    
-    with open(os.path.join(templates_dir, 'index.html'), 'w') as f:
-        f.write(index_template)
-    
-    with open(os.path.join(templates_dir, 'comparison.html'), 'w') as f:
-        f.write(comparison_template)
-    
-    with open(os.path.join(templates_dir, 'error.html'), 'w') as f:
-        f.write(error_template)
+    # Write templates that are missing; existing ones may be richer versions
+    templates = {
+        'base.html': base_template,
+        'index.html': index_template,
+        'comparison.html': comparison_template,
+        'error.html': error_template
+    }
+    for name, content in templates.items():
+        template_path = os.path.join(templates_dir, name)
+        if not os.path.exists(template_path):
+            with open(template_path, 'w') as f:
+                f.write(content)
 
 def main():
     # Parse command line arguments
@@ -440,20 +948,116 @@ def main():
                         help='Directory containing the comparison data')
     parser.add_argument('--port', type=int, default=5000,
                         help='Port to run the dashboard on')
+    parser.add_argument('--cache-mb', type=int, default=DEFAULT_CACHE_MB,
+                        help='Memory budget for parsed comparison files, in megabytes')
+    parser.add_argument('--production', action='store_true',
+                        help='Serve with a threaded production server instead of the debug server')
+    parser.add_argument('--host', type=str, default="127.0.0.1",
+                        help='Interface to listen on')
+    parser.add_argument('--threads', type=int, default=PRODUCTION_THREADS,
+                        help='Worker threads in production mode')
+    parser.add_argument('--template-cache-dir', type=str, default=None,
+                        help='Directory for compiled templates in production mode (default: a temp directory)')
     
     args = parser.parse_args()
     
     # Update configuration
     global DATA_DIR
     DATA_DIR = args.data_dir
+    comparison_cache.max_bytes = args.cache_mb * 1024 * 1024
+    
+    print(f"Starting dashboard on http://{args.host}:{args.port}")
+    print(f"Using data directory: {DATA_DIR}")
+    
+    if args.production:
+        run_production(args.host, args.port, args.threads, args.template_cache_dir)
+        return
     
     # Create templates
     create_template_files()
     
     # Run the Flask app
-    print(f"Starting dashboard on http://localhost:{args.port}")
-    print(f"Using data directory: {DATA_DIR}")
-    app.run(debug=True, port=args.port)
+    app.run(debug=True, host=args.host, port=args.port)
+
+def run_production(host, port, threads, template_cache_dir=None):
+    """Serve the dashboard with waitress if installed, else werkzeug's server
+
+    Either way requests are handled by at most threads worker threads.
+
+    Templates are used as they are on disk (never rewritten) and compiled
+    up front, with their bytecode cached on disk for the next start.
+    """
+    app.config["TEMPLATES_AUTO_RELOAD"] = False
+    precompile_templates(template_cache_dir)
+    
+    try:
+        import waitress
+    except ImportError:
+        waitress = None
+    
+    if waitress is not None:
+        print(f"Serving with waitress ({threads} threads)")
+        waitress.serve(app, host=host, port=port, threads=threads)
+    else:
+        print(f"Serving with werkzeug's server ({threads} threads; install waitress for a production WSGI server)")
+        server = PooledWSGIServer(host, port, app, threads)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+
+class PooledWSGIServer(BaseWSGIServer):
+    """werkzeug's WSGI server handling connections on a fixed pool of threads
+
+    werkzeug's own threaded server starts a thread per request, without
+    bound. Connections close after each request (HTTP/1.0), so idle
+    keep-alive clients cannot hold on to the workers.
+    """
+
+    def __init__(self, host, port, app, threads):
+        super().__init__(host, port, app)
+        # Set after __init__, which would otherwise switch to HTTP/1.1 keep-alive
+        self.multithread = True
+        self._pool = ThreadPoolExecutor(max_workers=threads)
+
+    def process_request(self, request, client_address):
+        self._pool.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        pool = getattr(self, "_pool", None)
+        if pool is not None:
+            pool.shutdown(wait=False)
+
+def precompile_templates(cache_dir=None):
+    """Compile every template once, caching the bytecode in cache_dir
+
+    Cached bytecode is loaded as code, so a cache_dir other users could
+    write to is refused. Without cache_dir, Jinja's own per-user temp
+    directory is used; Jinja checks its ownership and permissions.
+    """
+    if cache_dir is None:
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache()
+    else:
+        try:
+            if private_dir(cache_dir):
+                app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+            else:
+                print(f"Warning: template bytecode cache disabled, {cache_dir} is not private to the current user")
+        except OSError as e:
+            print(f"Warning: template bytecode cache disabled, cannot use {cache_dir}: {e}")
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+import json
+import os
+import sqlite3
+from contextlib import closing
+from urllib.request import pathname2url
+from atomic_files import atomic_path
+
+# File extension of comparisons stored in SQLite
+SQLITE_SUFFIX = ".sqlite"
+
+SCHEMA = """
+CREATE TABLE metadata (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE endpoints (
+    position INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    method TEXT NOT NULL,
+    host TEXT NOT NULL,
+    path TEXT NOT NULL,
+    status TEXT NOT NULL,
+    change_type TEXT NOT NULL,
+    present_in TEXT NOT NULL,
+    missing_in TEXT NOT NULL,
+    diff_info TEXT
+);
+CREATE TABLE differences (
+    endpoint_position INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    pointer TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    record TEXT NOT NULL,
+    PRIMARY KEY (endpoint_position, seq)
+) WITHOUT ROWID;
+CREATE TABLE host_summary (
+    host TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    total INTEGER NOT NULL,
+    changed INTEGER NOT NULL,
+    unchanged INTEGER NOT NULL
+);
+CREATE INDEX endpoints_host ON endpoints (host);
+CREATE INDEX endpoints_method ON endpoints (method);
+CREATE INDEX endpoints_status ON endpoints (status);
+CREATE INDEX endpoints_change_type ON endpoints (change_type);
+CREATE INDEX endpoints_path ON endpoints (path);
+CREATE INDEX differences_pointer ON differences (pointer);
+"""
+
+# Endpoint filters accepted by query_endpoints, mapped to their columns
+FILTER_COLUMNS = {
+    "host": "host",
+    "method": "method",
+    "status": "status",
+    "change_type": "change_type"
+}
+
+# Endpoints whose differences are fetched per query
+QUERY_BATCH_SIZE = 500
+
+_ENDPOINT_COLUMNS = "position, key, method, host, path, status, present_in, missing_in, diff_info"
+
+
+def endpoint_change_types(dashboard_data):
+    """Map each endpoint key to "added", "removed", "modified" or "unchanged"
+
+    Added and removed come from the summary lists; every other endpoint is
+    modified or unchanged according to its status.
+    """
+    by_change_type = dashboard_data.get("summary", {}).get("by_change_type", {})
+    added = set(by_change_type.get("added", []))
+    removed = set(by_change_type.get("removed", []))
+    change_types = {}
+    for key, endpoint in dashboard_data.get("endpoints", {}).items():
+        if key in added:
+            change_types[key] = "added"
+        elif key in removed:
+            change_types[key] = "removed"
+        else:
+            change_types[key] = "modified" if endpoint.get("status") == "changed" else "unchanged"
+    return change_types
+
+
+def write_comparison_sqlite(path, dashboard_data):
+    """Write dashboard data (as built by process_for_dashboard) to a SQLite file
+
+    The database is built next to path and moved into place when complete.
+    """
+    with atomic_path(path) as tmp_path:
+        _write_sqlite(tmp_path, dashboard_data)
+
+
+def _write_sqlite(tmp_path, dashboard_data):
+    """Build the database at tmp_path"""
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    with closing(sqlite3.connect(tmp_path)) as conn:
+        # The file is not visible until it is renamed, so skip the journal
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.executescript(SCHEMA)
+
+        conn.executemany(
+            "INSERT INTO metadata (key, value) VALUES (?, ?)",
+            [(key, json.dumps(value)) for key, value in dashboard_data.get("metadata", {}).items()]
+        )
+
+        change_types = endpoint_change_types(dashboard_data)
+        endpoint_rows = []
+        difference_rows = []
+        for position, (key, endpoint) in enumerate(dashboard_data.get("endpoints", {}).items()):
+            diff_info, records = _split_differences(endpoint.get("differences", {}))
+            endpoint_rows.append((
+                position, key,
+                endpoint.get("method", ""), endpoint.get("host", ""), endpoint.get("path", ""),
+                endpoint.get("status", ""), change_types[key],
+                json.dumps(endpoint.get("present_in", [])),
+                json.dumps(endpoint.get("missing_in", [])),
+                json.dumps(diff_info) if diff_info is not None else None
+            ))
+            for seq, (pointer, record) in enumerate(records):
+                difference_rows.append((
+                    position, seq, pointer, record.get("kind") or record.get("change", "changed"),
+                    json.dumps(record)
+                ))
+        conn.executemany("INSERT INTO endpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", endpoint_rows)
+        conn.executemany("INSERT INTO differences VALUES (?, ?, ?, ?, ?)", difference_rows)
+
+        conn.executemany(
+            "INSERT INTO host_summary VALUES (?, ?, ?, ?, ?)",
+            [
+                (host, position, summary.get("total", 0), summary.get("changed", 0), summary.get("unchanged", 0))
+                for position, (host, summary) in enumerate(dashboard_data.get("summary", {}).get("by_host", {}).items())
+            ]
+        )
+        conn.commit()
+
+
+def _split_differences(differences):
+    """Return (diff_info, [(pointer, record)]) for nested or compact differences
+
+    Compact records are stored without their pointer and diff_info keeps the
+    remaining fields; nested differences are stored one value_mismatch
+    record per JSON pointer and have no diff_info.
+    """
+    if differences.get("format") == "compact":
+        diff_info = {key: value for key, value in differences.items() if key != "records"}
+        records = [
+            (record["pointer"], {key: value for key, value in record.items() if key != "pointer"})
+            for record in differences["records"]
+        ]
+        return diff_info, records
+
+    records = []
+    _flatten(differences, "", records)
+    return None, records
+
+
+def _flatten(node, pointer, out):
+    """Collect (json_pointer, value_mismatch record) pairs from nested differences"""
+    if node.get("type") == "value_mismatch":
+        out.append((pointer, node))
+        return
+    for key, child in node.items():
+        _flatten(child, pointer + "/" + key.replace("~", "~0").replace("/", "~1"), out)
+
+
+def _join_differences(diff_info, rows):
+    """Rebuild the differences object of an endpoint from its stored rows"""
+    if diff_info is not None:
+        differences = dict(diff_info)
+        differences["records"] = [dict(pointer=pointer, **json.loads(record)) for pointer, record in rows]
+        return differences
+
+    differences = {}
+    for pointer, record in rows:
+        node = differences
+        segments = [s.replace("~1", "/").replace("~0", "~") for s in pointer.split("/")[1:]]
+        for segment in segments[:-1]:
+            node = node.setdefault(segment, {})
+        if segments:
+            node[segments[-1]] = json.loads(record)
+        else:
+            differences = json.loads(record)
+    return differences
+
+
+def connect(path):
+    """Open a comparison database read-only"""
+    return sqlite3.connect(f"file:{pathname2url(os.path.abspath(path))}?mode=ro", uri=True)
+
+
+def load_metadata(path):
+    """Return the metadata object of a stored comparison"""
+    with closing(connect(path)) as conn:
+        return {key: json.loads(value) for key, value in conn.execute("SELECT key, value FROM metadata ORDER BY rowid")}
+
+
+def load_overview(path):
+    """Return (metadata, {status: endpoint count}) without reading any endpoint"""
+    with closing(connect(path)) as conn:
+        metadata = {key: json.loads(value) for key, value in conn.execute("SELECT key, value FROM metadata ORDER BY rowid")}
+        counts = dict(conn.execute("SELECT status, COUNT(*) FROM endpoints GROUP BY status"))
+    return metadata, counts
+
+
+def query_endpoints(path, host=None, method=None, status=None, change_type=None, path_prefix=None,
+                    path_regex=None, after=None, limit=None, with_differences=True):
+    """Return ({key: endpoint}, next_key) for endpoints matching every given filter
+
+    Endpoints come in key order, starting after the key `after`. path_regex
+    is a compiled pattern searched in the path. When limit cuts the results
+    short next_key is the key to resume after, otherwise None. Without
+    with_differences the differences rows are not read at all.
+    """
+    clauses = []
+    params = []
+    filters = {"host": host, "method": method, "status": status, "change_type": change_type}
+    for name, value in filters.items():
+        if value is not None:
+            clauses.append(f"{FILTER_COLUMNS[name]} = ?")
+            params.append(value)
+    if path_prefix:
+        # A range keeps the path index usable, unlike LIKE
+        clauses.append("path >= ? AND path < ?")
+        params.extend([path_prefix, path_prefix + "\U0010ffff"])
+    if path_regex is not None:
+        clauses.append("path_matches(path)")
+    if after is not None:
+        clauses.append("key > ?")
+        params.append(after)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    if limit is not None:
+        # One extra row tells whether there is a next page
+        where += " ORDER BY key LIMIT ?"
+        params.append(limit + 1)
+    else:
+        where += " ORDER BY key"
+
+    with closing(connect(path)) as conn:
+        if path_regex is not None:
+            conn.create_function("path_matches", 1, lambda p: path_regex.search(p) is not None, deterministic=True)
+        rows = conn.execute(f"SELECT {_ENDPOINT_COLUMNS} FROM endpoints {where}", params).fetchall()
+        next_key = None
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            next_key = rows[-1][1]
+        return _build_endpoints(conn, rows, with_differences), next_key
+
+
+def load_endpoint(path, key):
+    """Return one endpoint by key, or None if the comparison does not have it"""
+    with closing(connect(path)) as conn:
+        rows = conn.execute(f"SELECT {_ENDPOINT_COLUMNS} FROM endpoints WHERE key = ?", (key,)).fetchall()
+        return _build_endpoints(conn, rows).get(key)
+
+
+def load_comparison(path):
+    """Rebuild the full dashboard data of a stored comparison"""
+    with closing(connect(path)) as conn:
+        metadata = {key: json.loads(value) for key, value in conn.execute("SELECT key, value FROM metadata ORDER BY rowid")}
+        rows = conn.execute(f"SELECT {_ENDPOINT_COLUMNS} FROM endpoints ORDER BY position").fetchall()
+        endpoints = _build_endpoints(conn, rows)
+
+        by_host = {}
+        for host, total, changed, unchanged in conn.execute(
+                "SELECT host, total, changed, unchanged FROM host_summary ORDER BY position"):
+            by_host[host] = {"total": total, "changed": changed, "unchanged": unchanged, "endpoints": []}
+        by_change_type = {"added": [], "removed": [], "modified": []}
+        for key, host, status, change_type in conn.execute(
+                "SELECT key, host, status, change_type FROM endpoints ORDER BY position"):
+            by_host.setdefault(host, {"total": 0, "changed": 0, "unchanged": 0, "endpoints": []})["endpoints"].append(key)
+            if status == "changed":
+                by_change_type["modified"].append(key)
+            if change_type in ("added", "removed"):
+                by_change_type[change_type].append(key)
+
+    return {
+        "metadata": metadata,
+        "endpoints": endpoints,
+        "summary": {"by_host": by_host, "by_change_type": by_change_type}
+    }
+
+
+def _build_endpoints(conn, rows, with_differences=True):
+    """Turn endpoint rows into endpoint dicts, loading their differences"""
+    if not rows:
+        return {}
+    if not with_differences:
+        return {
+            key: {
+                "method": method,
+                "host": host,
+                "path": path,
+                "status": status,
+                "present_in": json.loads(present_in),
+                "missing_in": json.loads(missing_in)
+            }
+            for _, key, method, host, path, status, present_in, missing_in, _ in rows
+        }
+
+    # Fetch the difference rows of just these endpoints, a batch at a time
+    # to stay under SQLite's bound parameter limit
+    differences = {}
+    positions = [row[0] for row in rows]
+    for start in range(0, len(positions), QUERY_BATCH_SIZE):
+        batch = positions[start:start + QUERY_BATCH_SIZE]
+        cursor = conn.execute(
+            "SELECT endpoint_position, pointer, record FROM differences "
+            f"WHERE endpoint_position IN ({','.join('?' * len(batch))}) ORDER BY endpoint_position, seq",
+            batch
+        )
+        for position, pointer, record in cursor:
+            differences.setdefault(position, []).append((pointer, record))
+
+    endpoints = {}
+    for position, key, method, host, path, status, present_in, missing_in, diff_info in rows:
+        endpoints[key] = {
+            "method": method,
+            "host": host,
+            "path": path,
+            "status": status,
+            "present_in": json.loads(present_in),
+            "missing_in": json.loads(missing_in),
+            "differences": _join_differences(
+                json.loads(diff_info) if diff_info is not None else None,
+                differences.get(position, [])
+            )
+        }
+    return endpoints
+
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+import cProfile
+import heapq
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+# Peak RSS comes from resource, which only exists on POSIX
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Slowest endpoints listed in a profile report
+DEFAULT_SLOWEST = 10
+
+_NO_STAGE = nullcontext()
+
+
+class StageProfiler:
+    """Wall time, CPU time and peak memory of each stage of a comparison run
+
+    stage(name) is a context manager around one stage. CPU time includes
+    worker processes that finished during the stage. peak_rss_mb is the
+    process's resident high-water mark when the stage ended, so the stage
+    that raised it is the one that needed the memory; with trace_memory,
+    tracemalloc also gives each stage's own peak of Python allocations
+    (at a large cost in speed). entry_timings and endpoint_times are
+    handed to extract_endpoints and compare_api_structures, which fill
+    them in. With profile_stage, that stage runs under cProfile and the
+    stats are written to profile_file.
+
+    A disabled profiler records nothing: stage() returns a shared no-op
+    context and entry_timings and endpoint_times are None, so nothing
+    is timed per entry or per endpoint.
+    """
+
+    def __init__(self, enabled=False, slowest=DEFAULT_SLOWEST, trace_memory=False, profile_stage=None,
+                 profile_file=None):
+        self.enabled = enabled
+        self.slowest = slowest
+        self.trace_memory = enabled and trace_memory
+        self.profile_stage = profile_stage if enabled else None
+        self.profile_file = profile_file or (f"{profile_stage}.prof" if profile_stage else None)
+        self.stages = []
+        self.entry_timings = {} if enabled else None
+        self.endpoint_times = {} if enabled else None
+
+    def stage(self, name):
+        if not self.enabled:
+            return _NO_STAGE
+        return self._measure(name)
+
+    @contextmanager
+    def _measure(self, name):
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        profile = cProfile.Profile() if name == self.profile_stage else None
+        times = os.times()
+        start = time.perf_counter()
+        if profile is not None:
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            wall = time.perf_counter() - start
+            # User and system time of this process and of reaped children
+            cpu = sum(os.times()[:4]) - sum(times[:4])
+            record = {"stage": name, "wall_s": round(wall, 3), "cpu_s": round(cpu, 3), "peak_rss_mb": peak_rss_mb()}
+            if self.trace_memory:
+                record["traced_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1)
+            self.stages.append(record)
+            if profile is not None:
+                profile.dump_stats(self.profile_file)
+
+    def report(self):
+        """Return the stages measured so far, process_entry totals and the slowest endpoints"""
+        report = {"stages": list(self.stages)}
+        entries = (self.entry_timings or {}).get("process_entry")
+        if entries:
+            report["process_entry"] = {
+                "calls": entries["calls"],
+                "wall_s": round(entries["wall_s"], 3),
+                "cpu_s": round(entries["cpu_s"], 3)
+            }
+        if self.endpoint_times:
+            slowest = heapq.nlargest(self.slowest, self.endpoint_times.items(), key=lambda item: item[1])
+            report["slowest_endpoints"] = [{"endpoint": key, "seconds": round(seconds, 4)} for key, seconds in slowest]
+        if self.profile_stage and os.path.exists(self.profile_file):
+            report["profile_file"] = os.path.abspath(self.profile_file)
+        return report
+
+    def format(self):
+        """Return the report as text for the terminal"""
+        report = self.report()
+        lines = [f"{'stage':<24}{'wall s':>10}{'cpu s':>10}{'peak rss MB':>14}"]
+        for stage in report["stages"]:
+            rss = stage["peak_rss_mb"]
+            line = f"{stage['stage']:<24}{stage['wall_s']:>10.3f}{stage['cpu_s']:>10.3f}{rss if rss is not None else '-':>14}"
+            if "traced_peak_mb" in stage:
+                line += f"  (traced peak {stage['traced_peak_mb']} MB)"
+            lines.append(line)
+            if stage["stage"] == "load" and "process_entry" in report:
+                entries = report["process_entry"]
+                lines.append(f"  of which process_entry: {entries['wall_s']:.3f} s wall, {entries['cpu_s']:.3f} s cpu, "
+                             f"{entries['calls']} entries")
+        if "slowest_endpoints" in report:
+            lines.append(f"Slowest {len(report['slowest_endpoints'])} endpoints:")
+            lines.extend(f"{item['seconds']:>10.4f} s  {item['endpoint']}" for item in report["slowest_endpoints"])
+        if "profile_file" in report:
+            lines.append(f"cProfile stats of {self.profile_stage}: {report['profile_file']}")
+        return "\n".join(lines)
+
+
+def peak_rss_mb():
+    """Resident high-water mark of this process in MB, or None where unavailable"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is kilobytes on Linux and bytes on macOS
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
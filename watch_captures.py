@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+import argparse
+import fnmatch
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+from server import compare_api_structures
+from parse_cache import load_endpoints
+from dashboard_ready_comparison import (add_comparison_arguments, check_comparison_arguments, comparison_options,
+                                        publish_comparison)
+
+# inotify is optional; without it the directory is polled
+try:
+    from inotify_simple import INotify, flags
+except ImportError:
+    INotify = None
+
+# Seconds between polls (and the longest wait for an inotify event)
+DEFAULT_POLL_INTERVAL = 1.0
+
+
+class CaptureWatcher:
+    """Report capture files in a directory that are new or changed since last seen
+
+    With inotify_simple installed (Linux), a file is reported as soon as
+    its writer closes it or it is moved into the directory. Otherwise the
+    directory is polled and a file is reported once its size and mtime
+    are the same on two consecutive polls, so half-written exports are
+    not read.
+    """
+
+    def __init__(self, watch_dir, pattern="*.json", poll_interval=DEFAULT_POLL_INTERVAL, use_inotify=True):
+        self.watch_dir = watch_dir
+        self.pattern = pattern
+        self.poll_interval = poll_interval
+        self._seen = {}  # path -> (mtime_ns, size) of the version last reported
+        self._polled = {}  # path -> (mtime_ns, size) at the previous poll
+        self._inotify = None
+        if use_inotify and INotify is not None:
+            self._inotify = INotify()
+            self._inotify.add_watch(watch_dir, flags.CLOSE_WRITE | flags.MOVED_TO)
+
+    @property
+    def mode(self):
+        return "inotify" if self._inotify is not None else "polling"
+
+    def existing(self):
+        """Return the captures already in the directory, oldest first, and mark them seen"""
+        signatures = self._scan()
+        self._seen.update(signatures)
+        self._polled = dict(signatures)
+        return sorted(signatures, key=lambda path: signatures[path][0])
+
+    def wait(self):
+        """Wait up to one poll interval and return the captures that are ready, oldest first"""
+        if self._inotify is not None:
+            events = self._inotify.read(timeout=int(self.poll_interval * 1000))
+            candidates = {}
+            for name in {event.name for event in events}:
+                if fnmatch.fnmatch(name, self.pattern):
+                    path = os.path.join(self.watch_dir, name)
+                    signature = self._signature(path)
+                    if signature is not None:
+                        candidates[path] = signature
+            ready = {path: sig for path, sig in candidates.items() if self._seen.get(path) != sig}
+        else:
+            time.sleep(self.poll_interval)
+            signatures = self._scan()
+            # Ready once unchanged since the previous poll, and not yet reported in this version
+            ready = {path: sig for path, sig in signatures.items()
+                     if self._polled.get(path) == sig and self._seen.get(path) != sig}
+            self._polled = signatures
+
+        self._seen.update(ready)
+        return sorted(ready, key=lambda path: ready[path][0])
+
+    def close(self):
+        if self._inotify is not None:
+            self._inotify.close()
+
+    def _scan(self):
+        """Return {path: (mtime_ns, size)} of the matching files in the directory"""
+        signatures = {}
+        with os.scandir(self.watch_dir) as it:
+            for dir_entry in it:
+                if not fnmatch.fnmatch(dir_entry.name, self.pattern) or not dir_entry.is_file():
+                    continue
+                try:
+                    stat = dir_entry.stat()
+                except OSError:
+                    continue
+                signatures[dir_entry.path] = (stat.st_mtime_ns, stat.st_size)
+        return signatures
+
+    @staticmethod
+    def _signature(path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+
+def load_capture(file_path, args):
+    """Parse a capture once (or load it from the parse cache) into the endpoints to compare"""
+    name = os.path.basename(file_path)
+    endpoints, _ = load_endpoints(file_path, args.parse_cache_dir, args.parse_cache_mb * 1024 * 1024)
+    return {
+        "path": os.path.abspath(file_path),
+        "file_label": name,
+        "label": name.split('_')[0],
+        "endpoints": endpoints
+    }
+
+
+def stable_signature(path, interval):
+    """Wait until a file's size and mtime are the same twice, interval seconds apart, and return them"""
+    signature = CaptureWatcher._signature(path)
+    while True:
+        time.sleep(interval)
+        current = CaptureWatcher._signature(path)
+        if current is not None and current == signature:
+            return signature
+        signature = current
+
+
+def compare_and_publish(reference, capture, metadata, args):
+    """Compare a capture against its reference and publish the result to the dashboard"""
+    reference_label = reference["file_label"]
+    if reference_label == capture["file_label"]:
+        # Same file name in another directory (e.g. the baseline)
+        reference_label = f"reference/{reference_label}"
+    result = compare_api_structures(
+        file_paths=[
+            {"endpoints": reference["endpoints"], "file_label": reference_label},
+            {"endpoints": capture["endpoints"], "file_label": capture["file_label"]}
+        ],
+        output_dir=args.output_dir,
+        comparison_level=args.comparison_level,
+        workers=args.workers,
+        options=comparison_options(args)
+    )
+    metadata = dict(metadata, reference=reference["file_label"], capture=capture["file_label"])
+    return publish_comparison(result, [reference["label"], capture["label"]], metadata, args.output_dir, args)
+
+
+def watch(args, metadata):
+    """Compare captures as they arrive until interrupted (or once, with --once)"""
+    watcher = CaptureWatcher(args.watch_dir, args.pattern, args.poll_interval, use_inotify=not args.polling)
+    print(f"Watching {args.watch_dir} for {args.pattern} ({watcher.mode})")
+
+    baseline = None
+    if args.baseline:
+        baseline_signature = stable_signature(args.baseline, args.poll_interval)
+        try:
+            baseline = load_capture(args.baseline, args)
+        except (OSError, ValueError) as e:
+            print(f"Error reading baseline {args.baseline}: {e}")
+            sys.exit(1)
+        print(f"Baseline: {args.baseline} ({len(baseline['endpoints'])} endpoints)")
+        # Signature of a changed baseline seen on the previous round, reloaded once it holds still
+        pending_signature = None
+
+    # The two most recent captures, so a rewritten capture is compared with the one before it
+    recent = OrderedDict()
+    existing = watcher.existing()
+    if args.process_existing or args.once:
+        paths = existing
+    else:
+        paths = []
+        if baseline is None and existing:
+            # Without a baseline, the first new capture is compared with the newest existing one
+            try:
+                recent[os.path.abspath(existing[-1])] = load_capture(existing[-1], args)
+            except (OSError, ValueError) as e:
+                print(f"Error reading capture {existing[-1]}: {e}")
+
+    try:
+        while True:
+            # A baseline outside the watched directory is checked on every round, and
+            # reloaded once its size and mtime are the same on two consecutive rounds
+            if baseline is not None:
+                signature = CaptureWatcher._signature(args.baseline)
+                if signature is None or signature == baseline_signature:
+                    pending_signature = None
+                elif signature != pending_signature:
+                    pending_signature = signature
+                else:
+                    baseline_signature = signature
+                    pending_signature = None
+                    try:
+                        baseline = load_capture(args.baseline, args)
+                        print(f"Baseline changed: reloaded {args.baseline}")
+                    except (OSError, ValueError) as e:
+                        print(f"Error reading baseline {args.baseline}: {e}; keeping the previous baseline")
+
+            for path in paths:
+                started = time.time()
+                try:
+                    capture = load_capture(path, args)
+                except (OSError, ValueError) as e:
+                    print(f"Error reading capture {path}: {e}")
+                    continue
+
+                if baseline is not None and capture["path"] == baseline["path"]:
+                    baseline_signature = CaptureWatcher._signature(args.baseline)
+                    pending_signature = None
+                    baseline = capture
+                    print(f"Baseline changed: reloaded {path}")
+                    continue
+
+                reference = baseline
+                if reference is None:
+                    reference = next((c for p, c in reversed(recent.items()) if p != capture["path"]), None)
+                recent[capture["path"]] = capture
+                recent.move_to_end(capture["path"])
+                while len(recent) > 2:
+                    recent.popitem(last=False)
+
+                if reference is None:
+                    print(f"First capture {path}: waiting for the next one to compare against")
+                    continue
+
+                try:
+                    output_file = compare_and_publish(reference, capture, metadata, args)
+                except (OSError, ValueError) as e:
+                    print(f"Error comparing capture {path}: {e}")
+                    continue
+                print(json.dumps({
+                    "status": "success",
+                    "capture": path,
+                    "reference": reference["path"],
+                    "output_file": output_file,
+                    "compare_seconds": round(time.time() - started, 3),
+                    "seconds_since_capture_written": round(time.time() - os.path.getmtime(path), 3)
+                }))
+                sys.stdout.flush()
+
+            if args.once:
+                break
+            paths = watcher.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Watch a directory of Charles exports and publish comparisons as captures arrive")
+    parser.add_argument('--watch_dir', type=str, required=True,
+                        help='Directory QA drops capture exports into')
+    parser.add_argument('--output_dir', type=str, default="./dashboard_data",
+                        help='Directory to save comparison results')
+    parser.add_argument('--baseline', type=str, default=None,
+                        help='Capture every new capture is compared against (default: the previous capture)')
+    parser.add_argument('--pattern', type=str, default="*.json",
+                        help='File name pattern of captures in the watched directory')
+    parser.add_argument('--poll_interval', type=float, default=DEFAULT_POLL_INTERVAL,
+                        help='Seconds between directory polls')
+    parser.add_argument('--polling', action='store_true',
+                        help='Poll even when inotify is available (e.g. on network filesystems)')
+    parser.add_argument('--process_existing', action='store_true',
+                        help='Also compare the captures already in the directory, oldest first')
+    parser.add_argument('--once', action='store_true',
+                        help='Compare the captures already in the directory and exit')
+    add_comparison_arguments(parser)
+    args = parser.parse_args()
+    check_comparison_arguments(parser, args)
+
+    try:
+        metadata = json.loads(args.metadata)
+    except json.JSONDecodeError:
+        print("Error: metadata is not valid JSON")
+        sys.exit(1)
+
+    if not os.path.isdir(args.watch_dir):
+        print(f"Error: {args.watch_dir} is not a directory")
+        sys.exit(1)
+    if args.baseline and not os.path.isfile(args.baseline):
+        print(f"Error reading file {args.baseline}: file not found")
+        sys.exit(1)
+    if not os.path.exists(args.output_dir):
+        os.makedirs(args.output_dir)
+
+    watch(args, metadata)
+
+
+if __name__ == "__main__":
+    main()